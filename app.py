@@ -1,15 +1,28 @@
 from flask import Flask, render_template, request, send_file, jsonify, current_app, Response
-from video_processor import download_full_video, trim_video, get_video_duration
+from video_processor import (
+    download_full_video, trim_video, get_video_duration, get_media_info, format_time,
+    estimate_download_size, normalize_playlist_url, generate_proxy, OUTPUT_MODES, SCREEN_MODES,
+    OUTPUT_TARGETS, VARIANT_POLICIES
+)
 import os
 import logging
 import json
 import re
-import zipfile
 import shutil
 import threading
 import time
+import unicodedata
+import concurrent.futures
 from datetime import datetime
-from progress_tracker import progress_tracker
+from urllib.parse import quote
+from progress_tracker import progress_tracker, TERMINAL_STATUSES
+from metrics import registry, ACTIVE_JOBS, JOBS_TOTAL, ZIP_STREAM_SECONDS
+from tracing import start_trace, get_tracer, find_trace, tracing_requested
+from library_index import LibraryIndex, is_library_file
+from janitor import Janitor, has_space_for, GB
+from zip_stream import build_entries, stream_zip, zip_size, zip_etag
+from result_cache import ResultCache
+from cancellation import cancel_registry, JobCancelled
 from pathlib import Path
 
 # Create Flask app
@@ -49,14 +62,81 @@ def get_downloads_path():
 BASE_DOWNLOAD_PATH = get_downloads_path()
 UPLOAD_FOLDER = os.path.join(BASE_DOWNLOAD_PATH, 'uploads')
 TEMP_FOLDER = os.path.join(BASE_DOWNLOAD_PATH, 'temp')
+PROXY_FOLDER = os.path.join(BASE_DOWNLOAD_PATH, 'proxies')
+CACHE_FOLDER = os.path.join(BASE_DOWNLOAD_PATH, 'cache')
+# Lock files naming paths in use, shared with batch_cli so neither side's janitor evicts the other's work
+LOCKS_FOLDER = os.path.join(BASE_DOWNLOAD_PATH, 'locks')
 
 # Create folders if they don't exist
-for folder in [UPLOAD_FOLDER, TEMP_FOLDER]:
+for folder in [UPLOAD_FOLDER, TEMP_FOLDER, PROXY_FOLDER, CACHE_FOLDER, LOCKS_FOLDER]:
     if not os.path.exists(folder):
         os.makedirs(folder)
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['TEMP_FOLDER'] = TEMP_FOLDER
+app.config['PROXY_FOLDER'] = PROXY_FOLDER
+
+# Index of downloaded recordings, kept in sync as downloads complete and files are cleaned up
+library_index = LibraryIndex(os.path.join(BASE_DOWNLOAD_PATH, 'library.db'), UPLOAD_FOLDER, get_media_info)
+library_index.reconcile()
+
+def _on_janitor_remove(folder_name, path):
+    if folder_name == 'uploads':
+        library_index.remove(os.path.basename(path))
+        remove_proxy(os.path.basename(path))
+
+def _quota(env_name):
+    value = os.environ.get(env_name)
+    return int(float(value) * GB) if value else None
+
+# Background cleanup: age limit, per-folder byte quotas (LRU) and orphaned temp folders
+janitor_folders = {
+    'uploads': (UPLOAD_FOLDER, _quota('UPLOADS_QUOTA_GB')),
+    'temp': (TEMP_FOLDER, _quota('TEMP_QUOTA_GB')),
+    'proxies': (PROXY_FOLDER, _quota('PROXY_QUOTA_GB')),
+    'cache': (CACHE_FOLDER, _quota('RESULT_CACHE_QUOTA_GB')),
+}
+if progress_tracker.progress_dir:
+    janitor_folders['progress'] = (progress_tracker.progress_dir, _quota('PROGRESS_QUOTA_GB'))
+janitor = Janitor(
+    janitor_folders,
+    max_age_days=float(os.environ.get('MAX_FILE_AGE_DAYS', 7)),
+    interval=float(os.environ.get('JANITOR_INTERVAL', 300)),
+    on_remove=_on_janitor_remove,
+    lock_dir=LOCKS_FOLDER
+)
+# Finished trim outputs, so resubmitting the same cut doesn't re-encode it
+result_cache = ResultCache(CACHE_FOLDER, max_age=float(os.environ.get('RESULT_CACHE_HOURS', 24)) * 3600)
+
+DISK_RESERVE_BYTES = int(float(os.environ.get('DISK_RESERVE_GB', 1)) * GB)
+
+# In-flight downloads keyed by (normalized playlist URL, variant), so identical
+# submissions attach to the running job instead of fetching everything twice
+_inflight_downloads = {}
+_inflight_lock = threading.Lock()
+# Disk space promised to admitted downloads that are still running, by process_id
+_disk_reservations = {}
+
+# Preview proxies are encoded by a small bounded pool so they can't starve
+# trims of CPU; one queued/running job per filename
+_proxy_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.environ.get('PROXY_WORKERS', 1)), thread_name_prefix='proxy'
+)
+_proxy_jobs = set()
+_proxy_lock = threading.Lock()
+
+# Process IDs issued by /process-id for a trim request that hasn't started yet
+# (issue time), so the page can cancel the job while the request runs
+_reserved_process_ids = {}
+_reserved_lock = threading.Lock()
+RESERVED_ID_TTL = 3600
+
+# Large file transfers can be offloaded to a front-end web server:
+#   USE_X_SENDFILE=1             -> X-Sendfile header (Apache, lighttpd)
+#   X_ACCEL_REDIRECT_PREFIX=/dl/ -> X-Accel-Redirect header (nginx internal location
+#                                   aliased to the Downloads/video_processor folder)
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
+app.config['X_ACCEL_REDIRECT_PREFIX'] = os.environ.get('X_ACCEL_REDIRECT_PREFIX')
 
 def validate_filename(filename, is_segment=False):
     """Validate and sanitize filename"""
@@ -92,14 +172,131 @@ def validate_timestamp(timestamp):
         raise ValueError('Invalid time values')
     return True
 
+def set_attachment(response, download_name):
+    """Content-Disposition for a user-chosen name, escaped like send_file does"""
+    try:
+        download_name.encode('ascii')
+        names = {'filename': download_name}
+    except UnicodeEncodeError:
+        # ASCII fallback plus the exact name as RFC 5987 filename*
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        names = {'filename': simple, 'filename*': f"UTF-8''{quote(download_name, safe='!#$&+^`|')}"}
+    response.headers.set('Content-Disposition', 'attachment', **names)
+
+def send_download(file_path, download_name, mimetype=None):
+    """Send a file with Range/ETag support, offloading to nginx when configured"""
+    prefix = app.config.get('X_ACCEL_REDIRECT_PREFIX')
+    if prefix:
+        relative = os.path.relpath(file_path, BASE_DOWNLOAD_PATH).replace(os.sep, '/')
+        response = Response(mimetype=mimetype or 'application/octet-stream')
+        # nginx decodes the URI before looking the file up
+        response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(relative)
+        set_attachment(response, download_name)
+        return response
+
+    return send_file(
+        file_path,
+        as_attachment=True,
+        download_name=download_name,
+        mimetype=mimetype,
+        conditional=True,
+        etag=True
+    )
+
+def proxy_path_for(filename):
+    return os.path.join(PROXY_FOLDER, filename)
+
+def proxy_ready(filename):
+    """True if a proxy exists and is newer than its source"""
+    proxy_path = proxy_path_for(filename)
+    source_path = os.path.join(UPLOAD_FOLDER, filename)
+    return (os.path.exists(proxy_path) and os.path.exists(source_path)
+            and os.path.getmtime(proxy_path) >= os.path.getmtime(source_path))
+
+def ensure_proxy(filename):
+    """Generate the preview proxy for an upload in the background, once"""
+    if proxy_ready(filename):
+        return
+    with _proxy_lock:
+        if filename in _proxy_jobs:
+            return
+        _proxy_jobs.add(filename)
+
+    cancel_event = cancel_registry.register(f'proxy:{filename}')
+
+    def proxy_task():
+        source_path = os.path.join(UPLOAD_FOLDER, filename)
+        try:
+            if cancel_event.is_set() or not os.path.exists(source_path) or proxy_ready(filename):
+                return
+            with janitor.use(source_path, proxy_path_for(filename), proxy_path_for(filename) + '.part'):
+                generate_proxy(source_path, proxy_path_for(filename), cancel_event)
+        except JobCancelled:
+            logger.info(f"🛑 Proxy cancelled for {filename}")
+        except Exception as e:
+            logger.error(f"Proxy error for {filename}: {str(e)}")
+        finally:
+            cancel_registry.unregister(f'proxy:{filename}')
+            with _proxy_lock:
+                _proxy_jobs.discard(filename)
+
+    _proxy_executor.submit(proxy_task)
+
+def remove_proxy(filename):
+    # Stop a queued or running proxy encode for a recording that's going away
+    cancel_registry.cancel(f'proxy:{filename}')
+    try:
+        os.remove(proxy_path_for(filename))
+    except FileNotFoundError:
+        pass
+
 @app.route('/')
 def index():
-    # Get list of available MP4 files, excluding processed files
-    mp4_files = [f for f in os.listdir(UPLOAD_FOLDER) 
-                 if f.endswith('.mp4') and not any(x in f for x in ['_screen', '_av'])]
-    mp4_files.sort(key=lambda x: os.path.getmtime(os.path.join(UPLOAD_FOLDER, x)), reverse=True)
+    # All recordings from the library index, newest first
+    mp4_files = library_index.filenames()
     return render_template('index.html', mp4_files=mp4_files)
 
+@app.route('/library')
+def library():
+    """Paginated listing of downloaded recordings"""
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = min(500, max(1, int(request.args.get('per_page', 50))))
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': 'page and per_page must be integers'
+        }), 400
+
+    videos, total = library_index.list(page=page, per_page=per_page)
+    return jsonify({
+        'success': True,
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'videos': videos
+    })
+
+@app.route('/library/<filename>')
+def library_metadata(filename):
+    """Size, duration and stream details for one recording"""
+    if not filename or '..' in filename:
+        return jsonify({
+            'success': False,
+            'message': 'Invalid filename'
+        }), 400
+
+    video = library_index.get(filename)
+    if video is None:
+        return jsonify({
+            'success': False,
+            'message': f"Video file not found: {filename}"
+        }), 404
+    return jsonify({
+        'success': True,
+        'video': video
+    })
+
 
 @app.route('/check-progress/<process_id>')
 def check_progress(process_id):
@@ -107,6 +304,64 @@ def check_progress(process_id):
     progress_data = progress_tracker.get_progress(process_id)
     return jsonify(progress_data)
 
+@app.route('/progress-stream/<process_id>')
+def progress_stream(process_id):
+    """Push progress for a process as Server-Sent Events"""
+    try:
+        last_version = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        last_version = 0
+
+    def generate():
+        sent = {}
+        version = last_version
+        while True:
+            snapshot = progress_tracker.wait_for_update(process_id, version, timeout=15)
+            if snapshot is None:
+                current = progress_tracker.get_progress(process_id)
+                if 'version' not in current:
+                    # Unknown or evicted process: send the last known state (or
+                    # status "unknown") and end the stream instead of idling forever
+                    yield f"data: {json.dumps(current)}\n\n"
+                    break
+                # Comment line keeps proxies from closing an idle connection
+                yield ': keepalive\n\n'
+                continue
+
+            version = snapshot['version']
+            # Only changed keys are sent after the first event; removed keys are null
+            delta = {k: v for k, v in snapshot.items() if sent.get(k) != v}
+            delta.update({k: None for k in sent if k not in snapshot})
+            sent = snapshot
+            yield f"id: {version}\ndata: {json.dumps(delta)}\n\n"
+
+            if snapshot.get('status') in TERMINAL_STATUSES:
+                break
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Expose counters and histograms in the Prometheus text format"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/trace/<process_id>')
+def download_trace(process_id):
+    """Download a job's trace in Chrome trace format (chrome://tracing, Perfetto)"""
+    tracer = find_trace(process_id)
+    if tracer is None:
+        return jsonify({
+            'success': False,
+            'message': 'No trace recorded for this process'
+        }), 404
+
+    response = jsonify(tracer.to_chrome_trace())
+    response.headers['Content-Disposition'] = f'attachment; filename="trace-{process_id}.json"'
+    return response
+
 @app.route('/download/<filename>')
 def download(filename):
     try:
@@ -118,11 +373,7 @@ def download(filename):
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {filename}")
             
-        return send_file(
-            file_path,
-            as_attachment=True,
-            download_name=filename
-        )
+        return send_download(file_path, filename)
     except Exception as e:
         logger.error(f"Download error: {str(e)}")
         return jsonify({
@@ -130,36 +381,100 @@ def download(filename):
             'message': str(e)
         }), 404
 
-@app.route('/download-processed/<filename>')
-def download_processed(filename):
+@app.route('/proxy/<filename>')
+def proxy(filename):
     try:
-        if not filename or '..' in filename:
+        if not filename or '..' in filename or '/' in filename:
             raise ValueError("Invalid filename")
+        if not proxy_ready(filename):
+            raise FileNotFoundError(f"Proxy not ready: {filename}")
             
-        zip_path = os.path.join(app.config['TEMP_FOLDER'], filename)
-        
-        if not os.path.exists(zip_path):
-            logger.error(f"Zip file not found: {zip_path}")
+        return send_file(proxy_path_for(filename), mimetype='video/mp4', conditional=True, etag=True)
+    except Exception as e:
+        logger.error(f"Proxy error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 404
+
+@app.route('/download-processed/<process_id>/<filename>')
+def download_processed(process_id, filename):
+    """Serve a processed output, or stream all outputs of a job as a ZIP"""
+    try:
+        if not re.fullmatch(r'[0-9a-f]{32}', process_id):
+            raise ValueError("Invalid process ID")
+        if not filename or '..' in filename or '/' in filename:
+            raise ValueError("Invalid filename")
+
+        output_dir = os.path.join(app.config['TEMP_FOLDER'], process_id)
+        if not os.path.isdir(output_dir):
+            logger.error(f"Processed output not found: {output_dir}")
             return jsonify({
                 'success': False,
                 'message': 'Download file not found'
             }), 404
-            
-        try:
-            return send_file(
-                zip_path,
-                as_attachment=True,
-                download_name=filename,
-                mimetype='application/zip'
-            )
-        finally:
-            # Clean up zip file after sending
-            if os.path.exists(zip_path):
-                try:
-                    os.remove(zip_path)
-                except Exception as e:
-                    logger.error(f"Error removing zip file: {str(e)}")
-                    
+        os.utime(output_dir)  # Most recently used, for the janitor's age limit and LRU order
+
+        # Individual outputs are served straight from disk
+        if not filename.endswith('.zip'):
+            file_path = os.path.join(output_dir, filename)
+            if not os.path.exists(file_path):
+                return jsonify({
+                    'success': False,
+                    'message': 'Download file not found'
+                }), 404
+            return send_download(file_path, filename)
+
+        # Build the ZIP on the fly as a stored (uncompressed) archive
+        output_files = sorted(
+            os.path.join(output_dir, f) for f in os.listdir(output_dir)
+            if f.endswith('.mp4')
+        )
+        if not output_files:
+            return jsonify({
+                'success': False,
+                'message': 'Download file not found'
+            }), 404
+
+        entries = build_entries(output_files)
+        total_size = zip_size(entries)
+        etag = zip_etag(entries)
+
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers={'ETag': f'"{etag}"'})
+
+        # Honour Range requests so interrupted downloads can resume, unless
+        # If-Range says the archive has changed since the first attempt.
+        # Multi-range requests are ignored and get the whole archive (RFC 9110)
+        start, end, status = 0, total_size, 200
+        if_range = request.if_range
+        range_valid = not (if_range.etag or if_range.date) or if_range.etag == etag
+        single_range = request.range and len(request.range.ranges) == 1
+        if single_range and range_valid:
+            byte_range = request.range.range_for_length(total_size)
+            if byte_range is None:
+                return Response(status=416, headers={'Content-Range': f'bytes */{total_size}'})
+            start, end = byte_range
+            status = 206
+
+        def timed_stream():
+            with ZIP_STREAM_SECONDS.time(), get_tracer(process_id).span('zip_stream', 'zip', {'start': start, 'end': end}):
+                yield from stream_zip(entries, start, end)
+
+        response = Response(
+            timed_stream(),
+            status=status,
+            mimetype='application/zip',
+            direct_passthrough=True
+        )
+        response.headers['Content-Length'] = str(end - start)
+        response.headers['Accept-Ranges'] = 'bytes'
+        response.headers['ETag'] = f'"{etag}"'
+        set_attachment(response, filename)
+        if status == 206:
+            response.headers['Content-Range'] = f'bytes {start}-{end - 1}/{total_size}'
+        return response
+
     except Exception as e:
         logger.error(f"Error in download_processed: {str(e)}")
         return jsonify({
@@ -180,12 +495,23 @@ def get_duration_route(filename):
         if not os.path.exists(video_path):
             raise FileNotFoundError(f"Video file not found: {filename}")
             
-        # Get duration using FFprobe
-        duration = get_video_duration(video_path)
+        # Duration comes from the library index; FFprobe only on first lookup
+        video = library_index.get(filename)
+        if video and video.get('duration') is not None:
+            duration = format_time(video['duration'])
+        else:
+            duration = get_video_duration(video_path)
+        
+        # The UI previews the low-res proxy once it exists; crops chosen on it
+        # are scaled back to the source width/height before processing
+        ensure_proxy(filename)
         
         return jsonify({
             'success': True,
-            'duration': duration
+            'duration': duration,
+            'width': video.get('width') if video else None,
+            'height': video.get('height') if video else None,
+            'proxy_url': f"/proxy/{filename}" if proxy_ready(filename) else None
         })
         
     except FileNotFoundError as e:
@@ -211,27 +537,101 @@ def process_video():
         if 'video_url' in data:
             video_url = data.get('video_url')
             filename = data.get('filename')
+            output_mode = data.get('output_mode', 'faststart')
+            variant = data.get('variant', 'auto')
             
             if not video_url or not filename:
                 raise ValueError('Video URL and filename are required')
+            if output_mode not in OUTPUT_MODES:
+                raise ValueError(f"Output mode must be one of: {', '.join(OUTPUT_MODES)}")
+            if variant not in VARIANT_POLICIES:
+                raise ValueError(f"Variant must be one of: {', '.join(VARIANT_POLICIES)}")
             
             # Add .mp4 extension if not present
             if not filename.lower().endswith('.mp4'):
                 filename += '.mp4'
                 
-            # Create a process ID
-            process_id = os.urandom(16).hex()
+            # Coalesce identical submissions onto the job already running
+            flight_key = (normalize_playlist_url(video_url), variant, output_mode)
+            with _inflight_lock:
+                inflight = _inflight_downloads.get(flight_key)
+                if inflight is None:
+                    process_id = os.urandom(16).hex()
+                    _inflight_downloads[flight_key] = {'process_id': process_id, 'filename': filename}
+                    cancel_registry.register(process_id)
+            
+            if inflight is not None:
+                logger.info(f"Attaching duplicate request to running download {inflight['process_id']}")
+                return jsonify({
+                    'success': True,
+                    'message': f"Download already in progress as {inflight['filename']}",
+                    'filename': inflight['filename'],
+                    'process_id': inflight['process_id'],
+                    'coalesced': True
+                })
+            
+            progress_tracker.update_progress(process_id, {
+                "status": "queued",
+                "progress": 0,
+                "message": "Checking available disk space..."
+            })
+            
+            # Admission check: segments in temp plus the final MP4 need roughly
+            # twice the stream size, on top of what running downloads were
+            # promised. The same budget caps the variant chosen
+            with _inflight_lock:
+                promised = sum(_disk_reservations.values())
+            disk_budget = max(0, shutil.disk_usage(UPLOAD_FOLDER).free - promised - DISK_RESERVE_BYTES) // 2
+            estimated_size = estimate_download_size(video_url, variant, disk_budget)
+            reservation = 2 * (estimated_size or 0)
+            with _inflight_lock:
+                promised = sum(_disk_reservations.values())
+                admitted = has_space_for(UPLOAD_FOLDER, reservation, DISK_RESERVE_BYTES, promised)
+                if admitted:
+                    _disk_reservations[process_id] = reservation
+            if not admitted:
+                free_gb = (shutil.disk_usage(UPLOAD_FOLDER).free - promised) / GB
+                message = f"Not enough disk space: download needs about {reservation / GB:.1f} GB, {free_gb:.1f} GB free"
+                progress_tracker.update_progress(process_id, {
+                    "status": "error",
+                    "message": message
+                })
+                with _inflight_lock:
+                    _inflight_downloads.pop(flight_key, None)
+                cancel_registry.unregister(process_id)
+                return jsonify({
+                    'success': False,
+                    'message': message
+                }), 507
+            
+            if tracing_requested(data):
+                start_trace(process_id)
             
             # Start download in a separate thread
             def download_task():
+                ACTIVE_JOBS.labels(kind='download').inc()
+                status = 'complete'
                 try:
-                    download_full_video(video_url, filename, process_id)
+                    with janitor.use(os.path.join(UPLOAD_FOLDER, filename), os.path.join(TEMP_FOLDER, process_id)):
+                        download_full_video(video_url, filename, process_id, output_mode, variant, disk_budget)
+                    library_index.add(filename)
+                    ensure_proxy(filename)
+                except JobCancelled:
+                    status = 'cancelled'
                 except Exception as e:
+                    status = 'error'
                     logger.error(f"Download error: {str(e)}")
                     progress_tracker.update_progress(process_id, {
                         "status": "error",
                         "message": f"Error: {str(e)}"
                     })
+                finally:
+                    with _inflight_lock:
+                        _inflight_downloads.pop(flight_key, None)
+                        _disk_reservations.pop(process_id, None)
+                    cancel_registry.unregister(process_id)
+                    ACTIVE_JOBS.labels(kind='download').dec()
+                    JOBS_TOTAL.labels(kind='download', status=status).inc()
             
             thread = threading.Thread(target=download_task)
             thread.start()
@@ -250,9 +650,24 @@ def process_video():
             end_time = data['end_time']
             segment_number = data['filename']
             crop_data = data['crop_data']
+            screen_mode = data.get('screen_mode', 'standard')
+            if screen_mode not in SCREEN_MODES:
+                raise ValueError(f"Screen mode must be one of: {', '.join(SCREEN_MODES)}")
             
-            # Create a process ID
-            process_id = os.urandom(16).hex()
+            # Use the process ID issued by /process-id if the page asked for one
+            process_id = data.get('process_id')
+            if process_id:
+                with _reserved_lock:
+                    reserved = _reserved_process_ids.pop(process_id, None)
+                if reserved is None:
+                    return jsonify({
+                        'success': False,
+                        'message': 'Process ID is unknown or already in use'
+                    }), 409
+            else:
+                process_id = os.urandom(16).hex()
+            if tracing_requested(data):
+                start_trace(process_id)
             
             # Get original input filename without .mp4 extension
             source_video = os.path.splitext(input_file)[0]
@@ -260,6 +675,9 @@ def process_video():
             # Define zip filename early
             zip_filename = f"asl_{source_video}_segment-{segment_number}_zip.zip"
             
+            cancel_registry.register(process_id)
+            ACTIVE_JOBS.labels(kind='process').inc()
+            status = 'error'
             try:
                 # Create temporary directory for processing
                 temp_dir = os.path.join(app.config['TEMP_FOLDER'], process_id)
@@ -276,44 +694,52 @@ def process_video():
                     "progress": 0
                 })
                 
-                output_files = trim_video(
-                    input_file=input_file,
-                    screen_output=os.path.join(temp_dir, screen_file),
-                    webcam_output=os.path.join(temp_dir, webcam_file),
-                    start_time=start_time,
-                    end_time=end_time,
-                    crop_data=crop_data,
-                    process_id=process_id
+                input_path = os.path.join(UPLOAD_FOLDER, input_file)
+                outputs = {
+                    'screen': os.path.join(temp_dir, screen_file),
+                    'webcam': os.path.join(temp_dir, webcam_file)
+                }
+                cache_key = result_cache.key(
+                    input_path, start_time, end_time, crop_data,
+                    {'screen_mode': screen_mode, 'targets': OUTPUT_TARGETS}
                 )
                 
+                with janitor.use(input_path, temp_dir, result_cache.entry_path(cache_key)):
+                    cached = result_cache.get(cache_key, outputs)
+                    if cached:
+                        logger.info(f"♻️ Reusing cached result for {zip_filename}")
+                        output_files = list(cached['outputs'].values())
+                        frames_dropped = cached.get('frames_dropped')
+                    else:
+                        output_files, frames_dropped = trim_video(
+                            input_file=input_file,
+                            screen_output=outputs['screen'],
+                            webcam_output=outputs['webcam'],
+                            start_time=start_time,
+                            end_time=end_time,
+                            crop_data=crop_data,
+                            process_id=process_id,
+                            screen_mode=screen_mode
+                        )
+                        result_cache.put(
+                            cache_key,
+                            {region: path for region, path in outputs.items() if path in output_files},
+                            {'frames_dropped': frames_dropped}
+                        )
+                
                 if not output_files:
                     raise Exception("No output files were created")
                 
-                # Create zip file
-                zip_path = os.path.join(app.config['TEMP_FOLDER'], zip_filename)
-                
-                with zipfile.ZipFile(zip_path, 'w') as zipf:
-                    for file in output_files:
-                        if os.path.exists(file):
-                            zipf.write(file, os.path.basename(file))
-                            # Delete the individual video files after adding to zip
-                            os.remove(file)
-                        else:
-                            logger.error(f"Output file not found: {file}")
-                
-                # Clean up temp directory
-                if os.path.exists(temp_dir):
-                    shutil.rmtree(temp_dir)
-                
-                if not os.path.exists(zip_path):
-                    raise Exception("Failed to create zip file")
+                # Outputs stay in temp_dir; the ZIP is streamed on download
                 
                 # Update progress with download URL
                 progress_tracker.update_progress(process_id, {
                     "status": "complete",
                     "message": "Processing complete",
-                    "download_url": f"/download-processed/{zip_filename}"
+                    "download_url": f"/download-processed/{process_id}/{zip_filename}",
+                    "frames_dropped": frames_dropped
                 })
+                status = 'complete'
                 
                 return jsonify({
                     'success': True,
@@ -321,10 +747,22 @@ def process_video():
                     'process_id': process_id
                 })
                 
+            except JobCancelled:
+                status = 'cancelled'
+                shutil.rmtree(temp_dir, ignore_errors=True)
+                return jsonify({
+                    'success': False,
+                    'message': 'Processing cancelled',
+                    'process_id': process_id
+                }), 409
             except Exception as e:
                 if os.path.exists(temp_dir):
                     shutil.rmtree(temp_dir)
                 raise e
+            finally:
+                cancel_registry.unregister(process_id)
+                ACTIVE_JOBS.labels(kind='process').dec()
+                JOBS_TOTAL.labels(kind='process', status=status).inc()
                     
     except Exception as e:
         logger.error(f"Process video error: {str(e)}")
@@ -333,26 +771,83 @@ def process_video():
             'message': str(e)
         }), 500
     
+@app.route('/process-id', methods=['POST'])
+def new_process_id():
+    """Issue a process ID for an upcoming trim request, so it can be cancelled while running"""
+    now = time.time()
+    process_id = os.urandom(16).hex()
+    with _reserved_lock:
+        expired = [pid for pid, issued in _reserved_process_ids.items() if now - issued > RESERVED_ID_TTL]
+        for pid in expired:
+            del _reserved_process_ids[pid]
+        _reserved_process_ids[process_id] = now
+    for pid in expired:
+        cancel_registry.unregister(pid)
+    cancel_registry.register(process_id)
+    
+    return jsonify({
+        'success': True,
+        'process_id': process_id
+    })
+
+@app.route('/cancel/<process_id>', methods=['POST'])
+def cancel(process_id):
+    """Stop a running download or processing job"""
+    if not cancel_registry.cancel(process_id):
+        return jsonify({
+            'success': False,
+            'message': 'No running job with that ID'
+        }), 404
+        
+    logger.info(f"🛑 Cancellation requested for {process_id}")
+    return jsonify({
+        'success': True,
+        'message': 'Cancelling'
+    })
+    
 @app.route('/cleanup', methods=['POST'])
 def cleanup():
     try:
         # Get list of files before cleanup, excluding processed files from uploads count
         files_removed = {
-            'uploads': [f for f in os.listdir(app.config['UPLOAD_FOLDER']) 
-                       if f.endswith('.mp4') and not any(x in f for x in ['_screen', '_av'])],
+            'uploads': [f for f in os.listdir(app.config['UPLOAD_FOLDER'])
+                       if is_library_file(f) and not janitor.in_use(os.path.join(app.config['UPLOAD_FOLDER'], f))],
             'temp': [f for f in os.listdir(app.config['TEMP_FOLDER']) 
-                    if f.endswith('.mp4') or f.endswith('.zip')]
+                    if f.endswith('.mp4') or f.endswith('.zip')],
+            'cache': [d for d in os.listdir(CACHE_FOLDER)
+                     if not janitor.in_use(os.path.join(CACHE_FOLDER, d))]
         }
         
+        # Processed outputs live in per-job folders until cleaned up
+        processed_dirs = [
+            d for d in os.listdir(app.config['TEMP_FOLDER'])
+            if os.path.isdir(os.path.join(app.config['TEMP_FOLDER'], d))
+            and not janitor.in_use(os.path.join(app.config['TEMP_FOLDER'], d))
+            and any(f.endswith(('_screen.mp4', '_av.mp4'))
+                    for f in os.listdir(os.path.join(app.config['TEMP_FOLDER'], d)))
+        ]
+        for d in processed_dirs:
+            files_removed['temp'].extend(
+                os.path.join(d, f) for f in os.listdir(os.path.join(app.config['TEMP_FOLDER'], d))
+            )
+        
         # Clean uploads folder
         for file in files_removed['uploads']:
             file_path = os.path.join(app.config['UPLOAD_FOLDER'], file)
             os.remove(file_path)
+            library_index.remove(file)
+            remove_proxy(file)
             
         # Clean temp folder
         for file in files_removed['temp']:
             file_path = os.path.join(app.config['TEMP_FOLDER'], file)
             os.remove(file_path)
+        for d in processed_dirs:
+            shutil.rmtree(os.path.join(app.config['TEMP_FOLDER'], d), ignore_errors=True)
+        
+        # Clean cached results
+        for d in files_removed['cache']:
+            shutil.rmtree(os.path.join(CACHE_FOLDER, d), ignore_errors=True)
             
         return jsonify({
             'success': True,
@@ -376,10 +871,13 @@ def cleanup_old_files(max_age_days=7):
                 filepath = os.path.join(folder, filename)
                 file_age_days = (current_time - os.path.getmtime(filepath)) / (24 * 3600)
                 
-                if file_age_days > max_age_days:
+                if file_age_days > max_age_days and not janitor.in_use(filepath):
                     try:
                         if os.path.isfile(filepath):
                             os.remove(filepath)
+                            if folder == app.config['UPLOAD_FOLDER']:
+                                library_index.remove(filename)
+                                remove_proxy(filename)
                         elif os.path.isdir(filepath):
                             shutil.rmtree(filepath)
                     except Exception as e:
@@ -402,13 +900,13 @@ def trigger_cleanup():
             'message': f'Error during cleanup: {str(e)}'
         }), 500
 
-# Initialize cleanup on first request
-def cleanup_init():
-    with app.app_context():
-        cleanup_old_files()
+DEBUG = os.environ.get('FLASK_DEBUG', '1') == '1'
 
-# Call cleanup_init when app starts
-cleanup_init()
+# Start the background janitor (runs its first pass right away, off the import path).
+# In debug mode `python app.py` also imports this module in the reloader's
+# parent process, which serves nothing; only the child should clean up
+if not (__name__ == '__main__' and DEBUG and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'):
+    janitor.start()
 
 if __name__ == '__main__':
     # Create required directories
@@ -422,4 +920,11 @@ if __name__ == '__main__':
     print("\n")
     print("="*50 + "\n")
     
-    app.run(debug=True, host='0.0.0.0', port=5002)
\ No newline at end of file
+    # Threaded so large transfers don't block progress polling and new jobs;
+    # for production, run behind nginx with X_ACCEL_REDIRECT_PREFIX set
+    app.run(
+        debug=DEBUG,
+        host='0.0.0.0',
+        port=5002,
+        threaded=True
+    )
\ No newline at end of file
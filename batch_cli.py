@@ -0,0 +1,254 @@
+"""
+Headless batch processing for whole course backlogs.
+
+Reads a manifest of recordings and segments, downloads and trims them in a
+process pool, and writes a summary report. Progress is saved to a state file
+after every task, so re-running the same command resumes where it stopped.
+
+JSON manifest:
+    [
+      {"video_url": "https://.../index.m3u8", "filename": "lecture-01.mp4",
+       "segments": [
+         {"segment": 1, "start_time": "00:01:00", "end_time": "00:20:00",
+          "crop_data": {"screen": {"x": 0, "y": 0, "width": 1536, "height": 1080},
+                        "webcam": {"x": 1536, "y": 0, "width": 384, "height": 270}}}
+       ]}
+    ]
+
+CSV manifest (one row per segment; crop columns are optional and default to
+the standard screen/webcam layout):
+    video_url,filename,segment,start_time,end_time,screen_x,screen_y,screen_width,screen_height,webcam_x,webcam_y,webcam_width,webcam_height
+
+Usage:
+    python batch_cli.py manifest.csv --workers 4 --report report.json
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+import concurrent.futures
+from typing import Dict, List
+
+from video_processor import (
+    download_full_video, trim_video, get_downloads_path, get_media_info,
+    calculate_default_crop_areas, logger, OUTPUT_MODES, SCREEN_MODES, VARIANT_POLICIES
+)
+from library_index import LibraryIndex
+from janitor import hold_paths
+
+CROP_FIELDS = ('x', 'y', 'width', 'height')
+TIME_PATTERN = re.compile(r'^\d{2}:[0-5]\d:[0-5]\d$')
+
+
+def _locks_dir() -> str:
+    """Shared with the web server, whose janitor skips paths locked here"""
+    return os.path.join(get_downloads_path(), 'locks')
+
+
+def load_manifest(path: str) -> List[Dict]:
+    """Load a JSON or CSV manifest into a list of recordings with their segments"""
+    if path.lower().endswith('.json'):
+        with open(path) as f:
+            recordings = json.load(f)
+    else:
+        grouped = {}
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                row = {k.strip(): (v or '').strip() for k, v in row.items() if k}
+                recording = grouped.setdefault(row['filename'], {
+                    'video_url': row.get('video_url') or None,
+                    'filename': row['filename'],
+                    'segments': []
+                })
+                if not row.get('segment'):
+                    continue
+                segment = {
+                    'segment': row['segment'],
+                    'start_time': row['start_time'],
+                    'end_time': row['end_time'],
+                }
+                if all(row.get(f'{region}_{field}') for region in ('screen', 'webcam') for field in CROP_FIELDS):
+                    segment['crop_data'] = {
+                        region: {field: float(row[f'{region}_{field}']) for field in CROP_FIELDS}
+                        for region in ('screen', 'webcam')
+                    }
+                recording['segments'].append(segment)
+        recordings = list(grouped.values())
+
+    for recording in recordings:
+        if not recording['filename'].lower().endswith('.mp4'):
+            recording['filename'] += '.mp4'
+        for segment in recording.get('segments', []):
+            for key in ('start_time', 'end_time'):
+                if not TIME_PATTERN.match(segment[key]):
+                    raise ValueError(f"{recording['filename']} segment {segment['segment']}: {key} must be HH:MM:SS")
+    return recordings
+
+
+def run_download(video_url: str, filename: str, output_mode: str, variant: str = 'auto') -> Dict:
+    """Worker: download one recording into the uploads folder"""
+    start = time.time()
+    process_id = os.urandom(16).hex()
+    temp_dir = os.path.join(get_downloads_path(), 'temp', process_id)
+    with hold_paths(_locks_dir(), os.path.join(get_downloads_path(), 'uploads', filename), temp_dir):
+        download_full_video(video_url, filename, process_id, output_mode, variant)
+    return {'elapsed': time.time() - start}
+
+
+def run_trim(filename: str, segment: Dict, output_dir: str, screen_mode: str = 'standard') -> Dict:
+    """Worker: cut one segment into screen and webcam outputs"""
+    start = time.time()
+    with hold_paths(_locks_dir(), os.path.join(get_downloads_path(), 'uploads', filename)):
+        crop_data = segment.get('crop_data')
+        if not crop_data:
+            info = get_media_info(os.path.join(get_downloads_path(), 'uploads', filename))
+            if not info or not info.get('width'):
+                raise Exception(f"Could not read video dimensions for {filename}")
+            crop_data = calculate_default_crop_areas(info['width'], info['height'])
+
+        source_video = os.path.splitext(filename)[0]
+        number = segment['segment']
+        os.makedirs(output_dir, exist_ok=True)
+        outputs, frames_dropped = trim_video(
+            input_file=filename,
+            screen_output=os.path.join(output_dir, f"asl_{source_video}_segment-{number}_screen.mp4"),
+            webcam_output=os.path.join(output_dir, f"asl_{source_video}_segment-{number}_av.mp4"),
+            start_time=segment['start_time'],
+            end_time=segment['end_time'],
+            crop_data=crop_data,
+            process_id=os.urandom(16).hex(),
+            screen_mode=screen_mode
+        )
+        return {'elapsed': time.time() - start, 'outputs': outputs, 'frames_dropped': frames_dropped}
+
+
+class BatchState:
+    """Completed tasks, persisted after each update so runs can resume"""
+    def __init__(self, path: str):
+        self.path = path
+        self.tasks = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.tasks = json.load(f).get('tasks', {})
+
+    def done(self, task_id: str) -> bool:
+        return self.tasks.get(task_id, {}).get('status') == 'complete'
+
+    def record(self, task_id: str, status: str, **details):
+        self.tasks[task_id] = {'status': status, 'finished_at': time.time(), **details}
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump({'tasks': self.tasks}, f, indent=2)
+        os.replace(self.path + '.tmp', self.path)
+
+
+def run_batch(recordings: List[Dict], state: BatchState, workers: int, output_root: str,
+              output_mode: str = 'faststart', screen_mode: str = 'standard',
+              variant: str = 'auto') -> Dict:
+    uploads = os.path.join(get_downloads_path(), 'uploads')
+    for folder in (uploads, os.path.join(get_downloads_path(), 'temp')):
+        os.makedirs(folder, exist_ok=True)
+    library_index = LibraryIndex(os.path.join(get_downloads_path(), 'library.db'), uploads, get_media_info)
+
+    summary = {'complete': 0, 'skipped': 0, 'failed': 0, 'failures': []}
+    futures = {}
+
+    def submit_trims(executor, recording):
+        source_video = os.path.splitext(recording['filename'])[0]
+        for segment in recording.get('segments', []):
+            task_id = f"trim:{recording['filename']}:{segment['segment']}"
+            if state.done(task_id):
+                summary['skipped'] += 1
+                continue
+            output_dir = os.path.join(output_root, source_video)
+            future = executor.submit(run_trim, recording['filename'], segment, output_dir, screen_mode)
+            futures[future] = (task_id, recording)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for recording in recordings:
+            task_id = f"download:{recording['filename']}"
+            # A file left by a killed run may be truncated; only trust it if it probes
+            indexed = library_index.get(recording['filename'])
+            already_there = bool(indexed and indexed['duration'] and indexed['video_codec'])
+            if state.done(task_id) or already_there:
+                summary['skipped'] += 1
+                submit_trims(executor, recording)
+            elif not recording.get('video_url'):
+                summary['failed'] += 1
+                summary['failures'].append({'task': task_id, 'error': 'No video_url and file not in uploads'})
+            else:
+                future = executor.submit(
+                    run_download, recording['video_url'], recording['filename'],
+                    recording.get('output_mode', output_mode), recording.get('variant', variant)
+                )
+                futures[future] = (task_id, recording)
+
+        while futures:
+            done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                task_id, recording = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"{task_id} failed: {e}")
+                    state.record(task_id, 'error', error=str(e))
+                    summary['failed'] += 1
+                    summary['failures'].append({'task': task_id, 'error': str(e)})
+                    continue
+
+                state.record(task_id, 'complete', **result)
+                summary['complete'] += 1
+                logger.info(f"✅ {task_id} finished in {result['elapsed']:.1f}s")
+                if task_id.startswith('download:'):
+                    library_index.add(recording['filename'])
+                    submit_trims(executor, recording)
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Download and trim recordings from a manifest')
+    parser.add_argument('manifest', help='CSV or JSON manifest')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help='Concurrent download/trim processes')
+    parser.add_argument('--output-dir', default=os.path.join(get_downloads_path(), 'batch'),
+                        help='Where trimmed outputs are written')
+    parser.add_argument('--output-mode', choices=list(OUTPUT_MODES), default='faststart',
+                        help='MP4 layout for downloads (fragmented skips the faststart rewrite)')
+    parser.add_argument('--variant', choices=list(VARIANT_POLICIES), default='auto',
+                        help='Rendition to download from master playlists (auto = lowest that fits the outputs)')
+    parser.add_argument('--screen-mode', choices=list(SCREEN_MODES), default='standard',
+                        help='Screen output encoding (screen_content drops duplicate frames)')
+    parser.add_argument('--state', help='Resume state file (default: <manifest>.state.json)')
+    parser.add_argument('--report', help='Write the summary report as JSON to this file')
+    args = parser.parse_args()
+
+    recordings = load_manifest(args.manifest)
+    state = BatchState(args.state or args.manifest + '.state.json')
+
+    start = time.time()
+    summary = run_batch(recordings, state, args.workers, args.output_dir, args.output_mode, args.screen_mode, args.variant)
+    summary['elapsed'] = time.time() - start
+    summary['recordings'] = len(recordings)
+
+    print("\n" + "="*50)
+    print("📦 Batch Complete")
+    print("="*50)
+    print(f"   ├─ ✅ Completed: {summary['complete']}")
+    print(f"   ├─ ⏭️ Skipped (already done): {summary['skipped']}")
+    print(f"   ├─ ❌ Failed: {summary['failed']}")
+    print(f"   └─ ⏱️ Time Taken: {summary['elapsed']:.1f}s")
+    for failure in summary['failures']:
+        print(f"      ⚠️ {failure['task']}: {failure['error']}")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+    sys.exit(1 if summary['failed'] else 0)
+
+
+if __name__ == '__main__':
+    main()
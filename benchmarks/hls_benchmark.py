@@ -0,0 +1,317 @@
+"""
+Reproducible benchmark for the download and trim pipeline.
+
+Generates synthetic HLS content with FFmpeg, serves it from a local HTTP
+origin with injectable latency, bandwidth limits and error rates, then runs
+download_full_video and trim_video against it and reports throughput and
+latency figures as JSON.
+
+    python benchmarks/hls_benchmark.py --segments 120 --latency-ms 40 --output results.json
+    python benchmarks/hls_benchmark.py --baseline results.json --tolerance 0.1
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# Metrics where a larger value is better; everything else is lower-is-better
+HIGHER_IS_BETTER = ('segments_per_second', 'mb_per_second', 'trim_realtime_factor')
+
+
+def generate_hls(out_dir: str, segments: int, segment_duration: float, bitrates: list,
+                 resolution: str = '1280x720', fps: int = 30, master: bool = False) -> str:
+    """Create synthetic HLS renditions and return the playlist path to request"""
+    duration = segments * segment_duration
+    width, height = resolution.split('x')
+    variants = []
+
+    for index, bitrate in enumerate(bitrates):
+        variant_dir = os.path.join(out_dir, f'v{index}')
+        os.makedirs(variant_dir, exist_ok=True)
+        cmd = [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error',
+            '-f', 'lavfi', '-i', f'testsrc2=size={resolution}:rate={fps}:duration={duration}',
+            '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+            '-c:v', 'libx264', '-preset', 'veryfast', '-b:v', bitrate,
+            '-g', str(int(fps * segment_duration)), '-sc_threshold', '0',
+            '-c:a', 'aac', '-b:a', '64k',
+            '-f', 'hls', '-hls_time', str(segment_duration), '-hls_list_size', '0',
+            '-hls_segment_filename', os.path.join(variant_dir, 'seg_%05d.ts'),
+            '-y', os.path.join(variant_dir, 'index.m3u8')
+        ]
+        subprocess.run(cmd, check=True, capture_output=True)
+        variants.append((f'v{index}/index.m3u8', bitrate))
+
+    if not master:
+        return variants[0][0]
+
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+    for uri, bitrate in variants:
+        bandwidth = int(float(bitrate.rstrip('kKmM')) * (1_000_000 if bitrate[-1] in 'mM' else 1000))
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={width}x{height}')
+        lines.append(uri)
+    with open(os.path.join(out_dir, 'master.m3u8'), 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return 'master.m3u8'
+
+
+class OriginHandler(SimpleHTTPRequestHandler):
+    """Static file handler with injectable latency, bandwidth cap and errors"""
+    latency = 0.0
+    bandwidth = 0  # Bytes per second per connection, 0 = unlimited
+    error_rate = 0.0
+    request_log = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        start = time.perf_counter()
+        if self.latency:
+            time.sleep(self.latency)
+        size = 0
+        if self.path.endswith('.ts') and random.random() < self.error_rate:
+            self.send_error(503, 'Injected failure')
+            status = 503
+        else:
+            super().do_GET()
+            status = 200
+            path = self.translate_path(self.path)
+            size = os.path.getsize(path) if os.path.isfile(path) else 0
+        self.request_log.append((self.path, status, size, time.perf_counter() - start))
+
+    def copyfile(self, source, outputfile):
+        if not self.bandwidth:
+            return super().copyfile(source, outputfile)
+        chunk_size = 16 * 1024
+        interval = chunk_size / self.bandwidth
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            time.sleep(interval)
+
+
+def start_origin(root: str, latency_ms: float, bandwidth_kbps: float, error_rate: float):
+    """Serve root on a free localhost port; returns (server, base_url, request_log)"""
+    request_log = []
+    handler = type('BenchOriginHandler', (OriginHandler,), {
+        'latency': latency_ms / 1000,
+        'bandwidth': bandwidth_kbps * 1000 / 8,
+        'error_rate': error_rate,
+        'request_log': request_log,
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(handler, directory=root))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/', request_log
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_benchmark(args) -> dict:
+    work_dir = tempfile.mkdtemp(prefix='hls-bench-')
+    import video_processor
+    from video_processor import calculate_default_crop_areas, format_time
+
+    # The pipeline writes under get_downloads_path(); point it at the sandbox
+    downloads_dir = os.path.join(work_dir, 'downloads')
+    original_get_downloads_path = video_processor.get_downloads_path
+    video_processor.get_downloads_path = lambda: downloads_dir
+    try:
+        for folder in ('uploads', 'temp'):
+            os.makedirs(os.path.join(downloads_dir, folder), exist_ok=True)
+
+        origin_dir = os.path.join(work_dir, 'origin')
+        os.makedirs(origin_dir)
+        playlist = generate_hls(
+            origin_dir, args.segments, args.segment_duration, args.bitrates.split(','),
+            args.resolution, args.fps, args.layout == 'master'
+        )
+        server, base_url, request_log = start_origin(
+            origin_dir, args.latency_ms, args.bandwidth_kbps, args.error_rate
+        )
+
+        # Time each segment and the remux from the client side
+        segment_latencies = []
+        original_download_segment = video_processor.download_segment
+        original_convert = video_processor.convert_m3u8_to_mp4
+        remux = {}
+
+        def timed_download_segment(task):
+            start = time.perf_counter()
+            try:
+                return original_download_segment(task)
+            finally:
+                segment_latencies.append(time.perf_counter() - start)
+
+        def timed_convert(m3u8_path, output_path, *rest, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original_convert(m3u8_path, output_path, *rest, **kwargs)
+            finally:
+                remux['seconds'] = time.perf_counter() - start
+
+        video_processor.download_segment = timed_download_segment
+        video_processor.convert_m3u8_to_mp4 = timed_convert
+
+        filename = 'bench.mp4'
+        download_start = time.perf_counter()
+        try:
+            video_processor.download_full_video(
+                base_url + playlist, filename, 'bench-download', args.output_mode, args.variant
+            )
+        except Exception as e:
+            # Segments still failing after retries (e.g. with --error-rate): report the failed run
+            return {
+                'failed': True,
+                'error': str(e),
+                'download_seconds': time.perf_counter() - download_start,
+                'segment_attempts': len(segment_latencies),
+                'origin_errors': sum(1 for _, status, _, _ in request_log if status != 200),
+            }
+        finally:
+            video_processor.download_segment = original_download_segment
+            video_processor.convert_m3u8_to_mp4 = original_convert
+            server.shutdown()
+        download_seconds = time.perf_counter() - download_start
+
+        segment_bytes = sum(
+            size for path, status, size, _ in request_log
+            if status == 200 and path.endswith('.ts')
+        )
+
+        results = {
+            'segments': args.segments,
+            'download_seconds': download_seconds,
+            'segments_per_second': args.segments / download_seconds,
+            'mb_per_second': segment_bytes / (1024 * 1024) / download_seconds,
+            'segment_latency_p50': percentile(segment_latencies, 50),
+            'segment_latency_p99': percentile(segment_latencies, 99),
+            'segment_attempts': len(segment_latencies),
+            'origin_errors': sum(1 for _, status, _, _ in request_log if status != 200),
+            'remux_seconds': remux.get('seconds', 0.0),
+        }
+
+        # Trim the middle of the recording with the default crop layout
+        if args.trim_seconds > 0:
+            width, height = (int(v) for v in args.resolution.split('x'))
+            total = args.segments * args.segment_duration
+            clip = min(args.trim_seconds, total)
+            start_at = max(0, (total - clip) / 2)
+            temp_dir = os.path.join(downloads_dir, 'temp', 'bench-trim')
+            os.makedirs(temp_dir, exist_ok=True)
+            trim_start = time.perf_counter()
+            video_processor.trim_video(
+                input_file=filename,
+                screen_output=os.path.join(temp_dir, 'bench_screen.mp4'),
+                webcam_output=os.path.join(temp_dir, 'bench_av.mp4'),
+                start_time=format_time(start_at),
+                end_time=format_time(start_at + clip),
+                crop_data=calculate_default_crop_areas(width, height),
+                process_id='bench-trim'
+            )
+            trim_seconds = time.perf_counter() - trim_start
+            results['trim_seconds'] = trim_seconds
+            results['trim_realtime_factor'] = clip / trim_seconds
+
+        return results
+    finally:
+        video_processor.get_downloads_path = original_get_downloads_path
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Return a list of (metric, baseline, current, change) regressions"""
+    regressions = []
+    for key, base in baseline.get('results', {}).items():
+        current = results.get(key)
+        if not isinstance(base, (int, float)) or not isinstance(current, (int, float)) or base == 0:
+            continue
+        change = (current - base) / base
+        worse = -change if key in HIGHER_IS_BETTER else change
+        if key.endswith(('_seconds', '_p50', '_p99', '_per_second', '_factor')) and worse > tolerance:
+            regressions.append((key, base, current, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark HLS download and trim throughput')
+    parser.add_argument('--segments', type=int, default=60)
+    parser.add_argument('--segment-duration', type=float, default=4.0)
+    parser.add_argument('--bitrates', default='2000k', help='Comma-separated variant bitrates')
+    parser.add_argument('--layout', choices=['media', 'master'], default='media')
+    parser.add_argument('--resolution', default='1280x720')
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--bandwidth-kbps', type=float, default=0, help='Per-connection cap, 0 = unlimited')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fraction of segment requests answered with 503')
+    parser.add_argument('--output-mode', choices=['faststart', 'fragmented'], default='faststart')
+    parser.add_argument('--variant', choices=['auto', 'best'], default='auto', help='Variant policy for --layout master')
+    parser.add_argument('--trim-seconds', type=float, default=30, help='Clip length to trim, 0 to skip')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write results JSON to this file')
+    parser.add_argument('--baseline', help='Compare against a previous results JSON')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='Allowed regression before failing')
+    parser.add_argument('--keep', action='store_true', help='Keep the generated content and outputs')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    runs = [run_benchmark(args) for _ in range(args.repeat)]
+    completed = [run for run in runs if not run.get('failed')]
+    results = {key: statistics.median(run[key] for run in completed) for key in (completed[0] if completed else {})}
+    results['failed_runs'] = len(runs) - len(completed)
+
+    report = {
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline', 'keep')},
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+        'failures': [run['error'] for run in runs if run.get('failed')],
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for key, base, current, change in regressions:
+            print(f"⚠️ {key}: {base:.4g} -> {current:.4g} ({change:+.1%})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+    if not completed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+from threading import Event, Lock
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once its cancellation has been requested"""
+    def __init__(self, message: str = 'Cancelled by user'):
+        super().__init__(message)
+
+
+class CancellationRegistry:
+    """Cancel flags for running jobs, keyed by process_id"""
+    def __init__(self):
+        self._events = {}
+        self._lock = Lock()
+
+    def register(self, process_id: str) -> Event:
+        with self._lock:
+            return self._events.setdefault(process_id, Event())
+
+    def unregister(self, process_id: str):
+        with self._lock:
+            self._events.pop(process_id, None)
+
+    def event(self, process_id: str) -> Event:
+        """The job's cancel flag; jobs started outside the web app get a private one"""
+        with self._lock:
+            return self._events.get(process_id) or Event()
+
+    def cancel(self, process_id: str) -> bool:
+        """Request cancellation; False if no such job is running"""
+        with self._lock:
+            event = self._events.get(process_id)
+        if event is None:
+            return False
+        event.set()
+        return True
+
+
+cancel_registry = CancellationRegistry()
@@ -0,0 +1,245 @@
+import os
+import shutil
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger('VideoProcessor')
+
+GB = 1024 * 1024 * 1024
+
+
+def _entry_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+# Windows locks are mandatory, so lock a byte past the recorded paths to keep them readable
+_LOCK_OFFSET = 1 << 20
+
+
+def _lock(f, blocking: bool = False) -> bool:
+    """Exclusive lock on f; the OS drops it when the holding process exits"""
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(_LOCK_OFFSET)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+@contextmanager
+def hold_paths(lock_dir: str, *paths: str):
+    """
+    Mark paths as in use for janitors running in other processes (the web
+    server while batch_cli works, or the other way round). The paths are
+    written to a locked file in lock_dir; a crashed holder's lock is released
+    by the OS, so nothing stays protected forever.
+    """
+    os.makedirs(lock_dir, exist_ok=True)
+    lock_path = os.path.join(lock_dir, f'{uuid.uuid4().hex}.lock')
+    f = open(lock_path, 'w')
+    try:
+        # Blocking: a janitor may be probing the still-empty file this instant
+        _lock(f, blocking=True)
+        # Written only after locking: a readable, unlocked file means a dead holder
+        f.seek(0)
+        f.write('\n'.join(os.path.abspath(p) for p in paths))
+        f.flush()
+        yield
+    finally:
+        f.close()
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+
+def held_paths(lock_dir: str) -> List[str]:
+    """Paths held by live processes; lock files left by dead ones are removed"""
+    try:
+        names = os.listdir(lock_dir)
+    except FileNotFoundError:
+        return []
+    paths = []
+    for name in names:
+        lock_path = os.path.join(lock_dir, name)
+        try:
+            f = open(lock_path, 'r+')
+        except OSError:
+            continue
+        with f:
+            recorded = f.read().splitlines()
+            if not _lock(f):
+                paths.extend(recorded)
+                continue
+        if recorded:
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+    return paths
+
+
+def _last_used(path: str) -> float:
+    """
+    Modification time, used for age and LRU ordering; jobs bump it with
+    os.utime when they use an entry. Access times aren't trusted: the
+    janitor's own size scans refresh them on directories.
+    """
+    return os.stat(path).st_mtime
+
+
+class Janitor:
+    """
+    Background thread that keeps the working folders within their byte
+    quotas (evicting least recently used entries first), removes entries
+    older than max_age_days and orphaned temp/<process_id> folders. Paths
+    registered with use(), in this process or (through lock_dir) any other,
+    are never removed.
+    """
+    def __init__(self, folders: Dict[str, Tuple[str, Optional[int]]], max_age_days: float = 7,
+                 interval: float = 300, orphan_grace: float = 600,
+                 on_remove: Callable[[str, str], None] = None, lock_dir: str = None):
+        self.folders = folders  # name -> (path, quota in bytes or None)
+        self.max_age_days = max_age_days
+        self.interval = interval
+        self.orphan_grace = orphan_grace
+        self.on_remove = on_remove
+        self.lock_dir = lock_dir
+        self._in_use = {}
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+
+    @contextmanager
+    def use(self, *paths: str):
+        """Protect paths from eviction while a job is using them"""
+        paths = [os.path.abspath(p) for p in paths]
+        with self._lock:
+            for path in paths:
+                self._in_use[path] = self._in_use.get(path, 0) + 1
+        try:
+            if self.lock_dir:
+                with hold_paths(self.lock_dir, *paths):
+                    yield
+            else:
+                yield
+        finally:
+            with self._lock:
+                for path in paths:
+                    self._in_use[path] -= 1
+                    if not self._in_use[path]:
+                        del self._in_use[path]
+
+    def in_use(self, path: str) -> bool:
+        path = os.path.abspath(path)
+        with self._lock:
+            claimed = list(self._in_use)
+        if self.lock_dir:
+            claimed += held_paths(self.lock_dir)
+        return any(p == path or p.startswith(path + os.sep) for p in claimed)
+
+    def _remove(self, name: str, path: str, reason: str) -> bool:
+        if self.in_use(path):
+            return False
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.error(f"Error removing {path}: {str(e)}")
+            return False
+        logger.info(f"🧹 Removed {reason}: {path}")
+        if self.on_remove:
+            self.on_remove(name, path)
+        return True
+
+    def _entries(self, folder: str) -> List[str]:
+        try:
+            return [os.path.join(folder, f) for f in os.listdir(folder)]
+        except FileNotFoundError:
+            return []
+
+    def run_once(self):
+        """One janitor pass over every folder"""
+        now = time.time()
+        for name, (folder, quota) in self.folders.items():
+            entries = []
+            for path in self._entries(folder):
+                try:
+                    last_used = _last_used(path)
+                except FileNotFoundError:
+                    continue
+
+                if (now - last_used) / (24 * 3600) > self.max_age_days:
+                    self._remove(name, path, 'expired entry')
+                    continue
+
+                # A segment folder (has a playlist) no running job claims is left
+                # over from a crashed or interrupted download
+                if (name == 'temp' and os.path.isdir(path)
+                        and os.path.exists(os.path.join(path, 'playlist.m3u8'))
+                        and now - last_used > self.orphan_grace):
+                    if self._remove(name, path, 'orphaned temp folder'):
+                        continue
+
+                entries.append((last_used, path))
+
+            if quota is None:
+                continue
+
+            sized = [(last_used, path, _entry_size(path)) for last_used, path in entries]
+            usage = sum(size for _, _, size in sized)
+            for last_used, path, size in sorted(sized):
+                if usage <= quota:
+                    break
+                if self._remove(name, path, f'least recently used entry ({name} over quota)'):
+                    usage -= size
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Janitor pass failed: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = Thread(target=self._loop, name='janitor', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def has_space_for(folder: str, required_bytes: int, reserve_bytes: int = GB, promised_bytes: int = 0) -> bool:
+    """
+    Admission check: would required_bytes still leave reserve_bytes free,
+    after promised_bytes already granted to running jobs?
+    """
+    return shutil.disk_usage(folder).free - promised_bytes - required_bytes >= reserve_bytes
@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import time
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Metadata columns filled from the media probe
+_PROBE_COLUMNS = ('duration', 'width', 'height', 'video_codec', 'audio_codec', 'fps', 'bitrate')
+
+
+def is_library_file(filename: str) -> bool:
+    """Source recordings only; processed outputs are excluded"""
+    return filename.endswith('.mp4') and not any(x in filename for x in ['_screen', '_av'])
+
+
+class LibraryIndex:
+    """
+    SQLite-backed index of the uploads folder.
+    Updated when downloads complete and on cleanup, so listing and
+    duration lookups never need to scan or probe the folder.
+    """
+    def __init__(self, db_path: str, upload_folder: str, probe: Callable[[str], Optional[Dict]]):
+        self.upload_folder = upload_folder
+        self._probe = probe
+        self._lock = Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS videos (
+                    filename TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    duration REAL,
+                    width INTEGER,
+                    height INTEGER,
+                    video_codec TEXT,
+                    audio_codec TEXT,
+                    fps REAL,
+                    bitrate REAL,
+                    indexed_at REAL NOT NULL
+                )
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_videos_mtime ON videos (mtime DESC)')
+
+    def add(self, filename: str, probe: bool = True) -> Optional[Dict]:
+        """Index (or re-index) a file in the uploads folder"""
+        if not is_library_file(filename):
+            return None
+        path = os.path.join(self.upload_folder, filename)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.remove(filename)
+            return None
+
+        info = (self._probe(path) or {}) if probe else {}
+        row = {
+            'filename': filename,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            **{column: info.get(column) for column in _PROBE_COLUMNS},
+            'indexed_at': time.time()
+        }
+        columns = ', '.join(row)
+        placeholders = ', '.join(f':{c}' for c in row)
+        with self._lock, self._conn:
+            self._conn.execute(f'INSERT OR REPLACE INTO videos ({columns}) VALUES ({placeholders})', row)
+        return row
+
+    def remove(self, filename: str):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM videos WHERE filename = ?', (filename,))
+
+    def get(self, filename: str) -> Optional[Dict]:
+        """Metadata for one file, probing it on first use or if it changed on disk"""
+        if not is_library_file(filename):
+            return None
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM videos WHERE filename = ?', (filename,)).fetchone()
+
+        path = os.path.join(self.upload_folder, filename)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            if row is not None:
+                self.remove(filename)
+            return None
+
+        if row is None or row['duration'] is None or row['size'] != stat.st_size or row['mtime'] != stat.st_mtime:
+            return self.add(filename)
+        return dict(row)
+
+    def list(self, page: int = 1, per_page: int = 50) -> Tuple[List[Dict], int]:
+        """Newest-first page of indexed files and the total count"""
+        offset = max(0, page - 1) * per_page
+        with self._lock:
+            total = self._conn.execute('SELECT COUNT(*) FROM videos').fetchone()[0]
+            rows = self._conn.execute(
+                'SELECT * FROM videos ORDER BY mtime DESC LIMIT ? OFFSET ?', (per_page, offset)
+            ).fetchall()
+        return [dict(row) for row in rows], total
+
+    def filenames(self) -> List[str]:
+        """Every indexed filename, newest first"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute('SELECT filename FROM videos ORDER BY mtime DESC')]
+
+    def reconcile(self):
+        """
+        Sync the index with the folder once (e.g. at startup). New files are
+        added without probing; their metadata is filled in on first get().
+        """
+        on_disk = {f for f in os.listdir(self.upload_folder) if is_library_file(f)}
+        with self._lock:
+            indexed = {row[0] for row in self._conn.execute('SELECT filename FROM videos')}
+        for filename in indexed - on_disk:
+            self.remove(filename)
+        for filename in on_disk - indexed:
+            self.add(filename, probe=False)
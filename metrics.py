@@ -0,0 +1,192 @@
+import time
+from contextlib import contextmanager
+from threading import Lock
+from typing import Dict, List, Tuple
+
+# Minimal Prometheus-style instruments rendered in the text exposition format.
+# Kept dependency-free so /metrics works with the stock requirements.
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: Dict[str, str] = None) -> str:
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ''
+    escaped = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs]
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = Lock()
+        self._values = {}
+
+    def labels(self, **labels) -> '_Child':
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        return _Child(self, key)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value) -> List[str]:
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}']
+
+
+class _Child:
+    """A metric bound to one set of label values"""
+    def __init__(self, metric: _Metric, key: Tuple[str, ...]):
+        self._metric = metric
+        self._key = key
+
+    def __getattr__(self, attr):
+        method = getattr(self._metric, f'_{attr}')
+        return lambda *args, **kwargs: method(self._key, *args, **kwargs)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _inc(self, key, amount: float = 1):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def inc(self, amount: float = 1):
+        self._inc((), amount)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _inc(self, key, amount: float = 1):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _dec(self, key, amount: float = 1):
+        self._inc(key, -amount)
+
+    def _set(self, key, value: float):
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1):
+        self._inc((), amount)
+
+    def dec(self, amount: float = 1):
+        self._dec((), amount)
+
+    def set(self, value: float):
+        self._set((), value)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def _observe(self, key, value: float):
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def _time(self, key):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._observe(key, time.perf_counter() - start)
+
+    def observe(self, value: float):
+        self._observe((), value)
+
+    def time(self):
+        return self._time(())
+
+    def _render_value(self, key, state) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state['counts']):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, {'le': _format_value(bound)})
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f'{self.name}_sum{labels} {state["sum"]}')
+        lines.append(f'{self.name}_count{labels} {state["count"]}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# Download pipeline
+PLAYLIST_FETCH_SECONDS = registry.register(Histogram(
+    'vp_playlist_fetch_seconds', 'Time to fetch and parse the M3U8 playlist'))
+SEGMENT_DOWNLOAD_SECONDS = registry.register(Histogram(
+    'vp_segment_download_seconds', 'Per-segment download latency', ('result',)))
+SEGMENT_BYTES = registry.register(Histogram(
+    'vp_segment_bytes', 'Downloaded segment size in bytes',
+    buckets=(64e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6, 16e6, 32e6)))
+SEGMENT_FAILURES = registry.register(Counter(
+    'vp_segment_failures_total', 'Segments that failed after all download attempts'))
+SEGMENT_RETRIES = registry.register(Counter(
+    'vp_segment_retries_total', 'Segment re-fetches after a failed or invalid attempt'))
+SEGMENT_INVALID = registry.register(Counter(
+    'vp_segment_invalid_total', 'Segments rejected by integrity validation', ('reason',)))
+SEGMENT_QUEUE_DEPTH = registry.register(Gauge(
+    'vp_segment_queue_depth', 'Segments waiting to be submitted to a download worker'))
+REMUX_SECONDS = registry.register(Histogram(
+    'vp_remux_seconds', 'Time spent remuxing segments into MP4 (convert_m3u8_to_mp4)'))
+
+# Processing pipeline
+ENCODE_SECONDS = registry.register(Histogram(
+    'vp_encode_seconds', 'FFmpeg encode time per output', ('output',)))
+ENCODE_REALTIME_FACTOR = registry.register(Histogram(
+    'vp_encode_realtime_factor', 'Seconds of video encoded per second of wall time', ('output',),
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)))
+ENCODE_FRAMES_DROPPED = registry.register(Counter(
+    'vp_encode_frames_dropped_total', 'Duplicate frames dropped by screen-content encoding', ('output',)))
+ZIP_STREAM_SECONDS = registry.register(Histogram(
+    'vp_zip_stream_seconds', 'Time to stream a processed ZIP to the client'))
+
+# Jobs
+ACTIVE_JOBS = registry.register(Gauge(
+    'vp_active_jobs', 'Jobs currently running', ('kind',)))
+JOBS_TOTAL = registry.register(Counter(
+    'vp_jobs_total', 'Finished jobs by outcome', ('kind', 'status')))
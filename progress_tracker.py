@@ -1,42 +1,148 @@
 import os
 import json
-from threading import Lock
+import time
+from threading import Condition, Lock, Thread
 
-class ProgressTracker:
+TERMINAL_STATUSES = ('complete', 'error', 'cancelled')
+
+class _JobProgress:
+    """Latest progress snapshot for one process, guarded by its own lock"""
     def __init__(self):
-        self._progress = {}
-        self._lock = Lock()
-        
-        # Create progress directory if it doesn't exist
-        self.progress_dir = 'progress'
-        if not os.path.exists(self.progress_dir):
-            os.makedirs(self.progress_dir)
-    
+        self.lock = Lock()
+        self.changed = Condition(self.lock)
+        self.data = {"status": "unknown"}
+        self.version = 0
+        self.updated_at = time.time()
+
+class ProgressTracker:
+    def __init__(self, ttl: float = 3600, mirror_dir: str = None, mirror_interval: float = 2.0):
+        self._jobs = {}
+        self._lock = Lock()  # Guards the _jobs mapping only
+        self.ttl = ttl
+        self._last_sweep = time.time()
+
+        # Optional disk mirror for multi-process deployments, written in batches
+        # by a background thread so updates never touch the filesystem
+        self.progress_dir = mirror_dir
+        self._dirty = set()
+        if self.progress_dir:
+            os.makedirs(self.progress_dir, exist_ok=True)
+            self._mirror_interval = mirror_interval
+            Thread(target=self._mirror_loop, daemon=True).start()
+
+    def _get_job(self, process_id: str, create: bool = False):
+        with self._lock:
+            job = self._jobs.get(process_id)
+            if job is None and create:
+                job = self._jobs[process_id] = _JobProgress()
+            return job
+
     def update_progress(self, process_id: str, data: dict):
         """Update progress for a specific process"""
-        progress_file = os.path.join(self.progress_dir, f"{process_id}.json")
-        with self._lock:
-            with open(progress_file, 'w') as f:
-                json.dump(data, f)
-    
+        job = self._get_job(process_id, create=True)
+        with job.lock:
+            job.version += 1
+            job.data = dict(data)
+            job.updated_at = time.time()
+            job.changed.notify_all()
+
+        if self.progress_dir:
+            with self._lock:
+                self._dirty.add(process_id)
+        self._maybe_evict()
+
     def get_progress(self, process_id: str) -> dict:
         """Get progress for a specific process"""
+        job = self._get_job(process_id)
+        if job is None:
+            return self._read_mirror(process_id)
+        with job.lock:
+            return {**job.data, "version": job.version}
+
+    def wait_for_update(self, process_id: str, version: int, timeout: float) -> dict:
+        """
+        Block until the process has a snapshot newer than `version`.
+        Returns the snapshot, or None if nothing changed within `timeout`.
+        """
+        deadline = time.time() + timeout
+        job = self._get_job(process_id)
+        while job is None:
+            # The job may not have reported yet; check back briefly
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            time.sleep(min(0.5, remaining))
+            job = self._get_job(process_id)
+
+        with job.lock:
+            if job.version <= version:
+                job.changed.wait_for(lambda: job.version > version, max(0, deadline - time.time()))
+            if job.version <= version:
+                return None
+            return {**job.data, "version": job.version}
+
+    def clear_progress(self, process_id: str):
+        """Clear progress for a specific process"""
+        with self._lock:
+            self._jobs.pop(process_id, None)
+            self._dirty.discard(process_id)
+        self._remove_mirror(process_id)
+
+    def _maybe_evict(self):
+        """Drop finished jobs older than the TTL, at most once a minute"""
+        now = time.time()
+        if now - self._last_sweep < 60:
+            return
+        self._last_sweep = now
+
+        with self._lock:
+            expired = [
+                pid for pid, job in self._jobs.items()
+                if job.data.get("status") in TERMINAL_STATUSES and now - job.updated_at > self.ttl
+            ]
+        for pid in expired:
+            self.clear_progress(pid)
+
+    def _read_mirror(self, process_id: str) -> dict:
+        if not self.progress_dir:
+            return {"status": "unknown"}
         progress_file = os.path.join(self.progress_dir, f"{process_id}.json")
         try:
-            with self._lock:
-                with open(progress_file, 'r') as f:
-                    return json.load(f)
+            with open(progress_file, 'r') as f:
+                return json.load(f)
         except (FileNotFoundError, json.JSONDecodeError):
             return {"status": "unknown"}
-    
-    def clear_progress(self, process_id: str):
-        """Clear progress for a specific process"""
-        progress_file = os.path.join(self.progress_dir, f"{process_id}.json")
+
+    def _remove_mirror(self, process_id: str):
+        if not self.progress_dir:
+            return
         try:
-            with self._lock:
-                os.remove(progress_file)
+            os.remove(os.path.join(self.progress_dir, f"{process_id}.json"))
         except FileNotFoundError:
             pass
 
+    def _mirror_loop(self):
+        while True:
+            time.sleep(self._mirror_interval)
+            self._maybe_evict()
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+            for pid in dirty:
+                job = self._get_job(pid)
+                if job is None:
+                    continue
+                with job.lock:
+                    snapshot = {**job.data, "version": job.version}
+                progress_file = os.path.join(self.progress_dir, f"{pid}.json")
+                try:
+                    with open(progress_file + '.tmp', 'w') as f:
+                        json.dump(snapshot, f)
+                    os.replace(progress_file + '.tmp', progress_file)
+                except OSError:
+                    pass
+
 # Global instance
-progress_tracker = ProgressTracker()
\ No newline at end of file
+progress_tracker = ProgressTracker(
+    ttl=float(os.environ.get('PROGRESS_TTL', 3600)),
+    mirror_dir=os.environ.get('PROGRESS_MIRROR_DIR')
+)
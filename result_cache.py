@@ -0,0 +1,96 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger('VideoProcessor')
+
+
+def _link_or_copy(src: str, dst: str):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class ResultCache:
+    """
+    Content-addressed cache of trim outputs. Entries are folders named by a
+    hash of the input file identity and the job parameters, holding one file
+    per output region. Entries older than max_age are ignored; size limits are
+    enforced by the janitor (LRU on the entry folders, refreshed on each hit).
+    """
+    def __init__(self, cache_dir: str, max_age: float = 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, input_path: str, start_time: str, end_time: str, crop_data: Dict, settings: Dict) -> str:
+        stat = os.stat(input_path)
+        crops = {
+            region: crop and {field: int(crop[field]) for field in ('x', 'y', 'width', 'height')}
+            for region, crop in sorted(crop_data.items())
+        }
+        identity = {
+            'input': [os.path.abspath(input_path), stat.st_size, stat.st_mtime_ns],
+            'start_time': start_time,
+            'end_time': end_time,
+            'crop_data': crops,
+            'settings': settings,
+        }
+        return hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key: str, outputs: Dict[str, str]) -> Optional[Dict]:
+        """
+        On a hit, link (or copy) the cached files to the requested output
+        paths ({region: path}) and return the entry's metadata.
+        """
+        entry = self.entry_path(key)
+        try:
+            with open(os.path.join(entry, 'meta.json')) as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if time.time() - meta['created_at'] > self.max_age:
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+
+        written = {}
+        try:
+            for region in meta['regions']:
+                _link_or_copy(os.path.join(entry, f'{region}.mp4'), outputs[region])
+                written[region] = outputs[region]
+        except OSError as e:
+            logger.warning(f"Result cache entry {key[:12]} unusable: {e}")
+            for path in written.values():
+                os.remove(path)
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+
+        os.utime(entry)  # Most recently used, for the janitor's LRU order
+        return {**meta, 'outputs': written}
+
+    def put(self, key: str, outputs: Dict[str, str], meta: Dict = None):
+        """Store finished outputs ({region: path}) under key"""
+        entry = self.entry_path(key)
+        if os.path.exists(entry):
+            return
+        staging = f'{entry}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(staging)
+            for region, path in outputs.items():
+                _link_or_copy(path, os.path.join(staging, f'{region}.mp4'))
+            with open(os.path.join(staging, 'meta.json'), 'w') as f:
+                json.dump({**(meta or {}), 'regions': list(outputs), 'created_at': time.time()}, f)
+            os.rename(staging, entry)
+        except OSError as e:
+            # Lost a race with an identical job, or the disk is full; either way not fatal
+            logger.warning(f"Could not cache result {key[:12]}: {e}")
+            shutil.rmtree(staging, ignore_errors=True)
@@ -0,0 +1,90 @@
+TS_PACKET_SIZE = 188
+TS_SYNC_BYTE = 0x47
+
+
+class SegmentValidationError(Exception):
+    """Raised when a downloaded segment is truncated or not media data"""
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class SegmentValidator:
+    """
+    Validates a segment while it streams in: error pages served with 200,
+    Content-Length mismatches, and for MPEG-TS, sync bytes / packet alignment
+    and (optionally) per-PID continuity counters. The container ('ts',
+    'fmp4' or 'packed_audio') comes from the playlist rather than the bytes,
+    so a TS segment with a corrupt first packet still fails. Encrypted
+    segments are ciphertext, so only their length and content type are checked.
+    """
+    def __init__(self, filename: str, expected_length: int = None, content_type: str = '',
+                 check_continuity: bool = False, encrypted: bool = False, container: str = 'ts'):
+        self.filename = filename
+        self.expected_length = expected_length
+        self.content_type = (content_type or '').lower()
+        self.check_continuity = check_continuity
+        self.encrypted = encrypted
+        self.size = 0
+        self.is_ts = container == 'ts' and not encrypted
+        self._pending = b''
+        self._counters = {}
+
+    def feed(self, chunk: bytes):
+        if self.size == 0 and chunk:
+            self._sniff(chunk)
+        self.size += len(chunk)
+
+        if not self.is_ts:
+            return
+
+        data = self._pending + chunk
+        aligned = len(data) - len(data) % TS_PACKET_SIZE
+        packets, self._pending = data[:aligned], data[aligned:]
+        if not packets:
+            return
+
+        # Every packet must start with the sync byte
+        sync_bytes = packets[::TS_PACKET_SIZE]
+        if sync_bytes.count(TS_SYNC_BYTE) != len(sync_bytes):
+            raise SegmentValidationError('ts_sync', f"{self.filename}: lost MPEG-TS sync near byte {self.size}")
+
+        if self.check_continuity:
+            self._check_continuity(packets)
+
+    def finish(self):
+        if self.size == 0:
+            raise SegmentValidationError('empty', f"{self.filename}: empty response")
+        if self.expected_length is not None and self.size != self.expected_length:
+            raise SegmentValidationError(
+                'length', f"{self.filename}: got {self.size} bytes, Content-Length was {self.expected_length}"
+            )
+        if self.is_ts and self._pending:
+            raise SegmentValidationError(
+                'ts_alignment', f"{self.filename}: {self.size} bytes is not a whole number of TS packets"
+            )
+
+    def _sniff(self, chunk: bytes):
+        head = chunk[:64].lstrip().lower()
+        looks_like_page = not self.encrypted and head.startswith((b'<!doctype', b'<html', b'<?xml', b'{'))
+        if 'text/html' in self.content_type or looks_like_page:
+            raise SegmentValidationError('not_media', f"{self.filename}: server returned a page, not media data")
+        if self.is_ts and chunk[0] != TS_SYNC_BYTE:
+            raise SegmentValidationError('ts_sync', f"{self.filename}: does not start with an MPEG-TS sync byte")
+
+    def _check_continuity(self, packets: bytes):
+        for offset in range(0, len(packets), TS_PACKET_SIZE):
+            header = packets[offset + 1:offset + 4]
+            pid = ((header[0] & 0x1F) << 8) | header[1]
+            has_payload = header[2] & 0x10
+            counter = header[2] & 0x0F
+            if pid == 0x1FFF or not has_payload:  # Null packets / adaptation-only
+                continue
+
+            discontinuity = (header[2] & 0x20) and packets[offset + 4] > 0 and packets[offset + 5] & 0x80
+            previous = self._counters.get(pid)
+            if previous is not None and not discontinuity and counter not in (previous, (previous + 1) & 0x0F):
+                raise SegmentValidationError(
+                    'ts_continuity', f"{self.filename}: continuity error on PID {pid} ({previous} -> {counter})"
+                )
+            self._counters[pid] = counter
@@ -5,29 +5,43 @@ function startProgressPolling(process_id, options = {}) {
         onProgress = () => {},
         onComplete = () => {},
         onError = () => {},
+        onCancelled = (message) => onError(message || 'Cancelled'),
         interval = 1000
     } = options;
     
+    // Returns true while the process is still running
+    const handleUpdate = (data) => {
+        console.log('Progress update:', data);  // For debugging
+        
+        if (data.status === 'error') {
+            onError(data.message);
+            return false;
+        }
+        
+        if (data.status === 'unknown') {
+            onError('Process not found');
+            return false;
+        }
+        
+        if (data.status === 'complete') {
+            onComplete(data);
+            return false;
+        }
+        
+        if (data.status === 'cancelled') {
+            onCancelled(data.message);
+            return false;
+        }
+        
+        onProgress(data);
+        return true;
+    };
+    
     const pollProgress = async () => {
         try {
             const response = await fetch(`/check-progress/${process_id}`);
             const data = await response.json();
-            
-            console.log('Progress update:', data);  // For debugging
-            
-            if (data.status === 'error') {
-                onError(data.message);
-                return false;
-            }
-            
-            if (data.status === 'complete') {
-                onComplete(data);
-                return false;
-            }
-            
-            onProgress(data);
-            return true;
-            
+            return handleUpdate(data);
         } catch (error) {
             console.error('Progress check error:', error);
             onError('Failed to check progress');
@@ -42,13 +56,67 @@ function startProgressPolling(process_id, options = {}) {
         }
     };
     
-    poll();
+    // Prefer server push; fall back to polling if the stream is unavailable
+    if (!window.EventSource) {
+        poll();
+        return;
+    }
+    
+    const source = new EventSource(`/progress-stream/${process_id}`);
+    let state = {};
+    let finished = false;
+    
+    source.onmessage = (event) => {
+        // Events carry only the keys that changed; null marks a removed key
+        const delta = JSON.parse(event.data);
+        state = { ...state, ...delta };
+        Object.keys(delta).forEach((key) => {
+            if (delta[key] === null) delete state[key];
+        });
+        
+        if (!handleUpdate(state)) {
+            finished = true;
+            source.close();
+        }
+    };
+    
+    source.onerror = () => {
+        if (finished) return;
+        console.warn('Progress stream lost, falling back to polling');
+        finished = true;
+        source.close();
+        poll();
+    };
 }
 
 
 
 
 
+async function newProcessId() {
+    const response = await fetch('/process-id', { method: 'POST' });
+    const data = await response.json();
+    if (!data.success) {
+        throw new Error(data.message || 'Could not start processing');
+    }
+    return data.process_id;
+}
+
+async function cancelJob(process_id, button) {
+    button.disabled = true;
+    try {
+        const response = await fetch(`/cancel/${process_id}`, { method: 'POST' });
+        const data = await response.json();
+        if (!data.success) {
+            console.warn('Cancel failed:', data.message);
+            button.disabled = false;
+        }
+    } catch (error) {
+        console.error('Cancel error:', error);
+        button.disabled = false;
+    }
+}
+
 function formatTime(seconds) {
     const hours = Math.floor(seconds / 3600);
     const minutes = Math.floor((seconds % 3600) / 60);
@@ -98,9 +166,11 @@ document.addEventListener('DOMContentLoaded', () => {
                 document.getElementById('video-duration').textContent = data.duration;
                 videoInfo.style.display = 'block';
                 
-                // Update video source and display video player
+                // Update video source and display video player; prefer the
+                // low-res proxy, crops are scaled back to the source size
                 const videoSource = document.getElementById('video-source');
-                videoSource.src = `/download/${filename}`;
+                videoSource.src = data.proxy_url || `/download/${filename}`;
+                videoCropper.setSourceSize(data.width, data.height);
                 videoPlayer.load();
                 videoPlayer.style.display = 'block';
                 
@@ -137,6 +207,8 @@ document.addEventListener('DOMContentLoaded', () => {
     document.getElementById('download-btn').addEventListener('click', async () => {
         const videoUrl = document.getElementById('video-url').value.trim();
         const filename = document.getElementById('filename').value.trim();
+        const outputMode = document.getElementById('output-mode').value;
+        const variant = document.getElementById('variant').value;
     
         if (!videoUrl || !filename) {
             alert('Please enter both video URL and filename');
@@ -162,13 +234,19 @@ document.addEventListener('DOMContentLoaded', () => {
                 },
                 body: JSON.stringify({  // Changed body format
                     video_url: videoUrl,
-                    filename: filename
+                    filename: filename,
+                    output_mode: outputMode,
+                    variant: variant
                 })
             });
     
             const data = await response.json();
             
             if (data.success) {
+                const cancelDownloadBtn = document.getElementById('cancel-download-btn');
+                cancelDownloadBtn.disabled = false;
+                cancelDownloadBtn.onclick = () => cancelJob(data.process_id, cancelDownloadBtn);
+                
                 startProgressPolling(data.process_id, {
                     onProgress: (progress) => {
                         console.log('Progress update:', progress);  // For debugging
@@ -221,6 +299,11 @@ document.addEventListener('DOMContentLoaded', () => {
                         progressContainer.style.display = 'none';
                         statusDiv.innerHTML = `<div class="error-message">Error: ${error}</div>`;
                         downloadBtn.disabled = false;
+                    },
+                    onCancelled: () => {
+                        progressContainer.style.display = 'none';
+                        statusDiv.innerHTML = '<div class="error-message">Download cancelled</div>';
+                        downloadBtn.disabled = false;
                     }
                 });
             } else {
@@ -297,8 +380,16 @@ document.addEventListener('DOMContentLoaded', () => {
         progressContainer.style.display = 'block';
         statusDiv.textContent = '';
         downloadContainer.textContent = '';
+        
+        const cancelProcessBtn = document.getElementById('cancel-process-btn');
+        cancelProcessBtn.disabled = true;
 
         try {
+            // Get the job ID first so the job can be cancelled while the request runs
+            const processId = await newProcessId();
+            cancelProcessBtn.disabled = false;
+            cancelProcessBtn.onclick = () => cancelJob(processId, cancelProcessBtn);
+            
             const response = await fetch('/process-video', {
                 method: 'POST',
                 headers: {
@@ -309,7 +400,9 @@ document.addEventListener('DOMContentLoaded', () => {
                     start_time: startTime,
                     end_time: endTime,
                     filename: trimFilename,
-                    crop_data: cropData
+                    crop_data: cropData,
+                    screen_mode: document.getElementById('screen-mode').value,
+                    process_id: processId
                 })
             });
 
@@ -339,7 +432,8 @@ document.addEventListener('DOMContentLoaded', () => {
                         }
                         
                         // Show success message
-                        statusDiv.innerHTML = '<div class="success-message">Video processed successfully! Download started automatically.</div>';
+                        const dropped = data.frames_dropped ? ` ${data.frames_dropped} duplicate screen frames skipped.` : '';
+                        statusDiv.innerHTML = `<div class="success-message">Video processed successfully! Download started automatically.${dropped}</div>`;
                         
                         // Re-enable the process button
                         processBtn.disabled = false;
@@ -7,6 +7,7 @@ class VideoCropper {
             webcam: null
         };
         this.maintainAspectRatio = true;  // Add this line
+        this.sourceSize = null;  // Full-resolution size when previewing a proxy
         this.setupEventListeners();
     }
 
@@ -225,8 +226,29 @@ const updateFromInput = (e) => {
         this.updatePreview('webcam');
     }
 
+    setSourceSize(width, height) {
+        this.sourceSize = width && height ? { width, height } : null;
+    }
+
     getCropData() {
-        return this.cropData;
+        // Crops are drawn on the preview; convert them to source pixels
+        const video = document.getElementById('video-player');
+        if (!this.sourceSize || !video.videoWidth || !video.videoHeight) {
+            return this.cropData;
+        }
+
+        const scaleX = this.sourceSize.width / video.videoWidth;
+        const scaleY = this.sourceSize.height / video.videoHeight;
+        const scaled = {};
+        for (const [type, data] of Object.entries(this.cropData)) {
+            scaled[type] = data && {
+                x: Math.round(data.x * scaleX),
+                y: Math.round(data.y * scaleY),
+                width: Math.round(data.width * scaleX),
+                height: Math.round(data.height * scaleY)
+            };
+        }
+        return scaled;
     }
 }
 
@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+
+# Opt-in per-job tracing exported in the Chrome trace event format
+# (load in chrome://tracing or https://ui.perfetto.dev).
+
+MAX_TRACES = 50
+
+
+class Tracer:
+    """Records spans and instant events for one job"""
+    def __init__(self, process_id: str):
+        self.process_id = process_id
+        self._origin = time.perf_counter()
+        self._events = []
+        self._threads = {}
+        self._lock = Lock()
+
+    def _now_us(self) -> float:
+        return (time.perf_counter() - self._origin) * 1_000_000
+
+    def _tid(self) -> int:
+        """Small stable id per thread so worker lanes read well in the viewer"""
+        ident = threading.get_ident()
+        with self._lock:
+            if ident not in self._threads:
+                self._threads[ident] = (len(self._threads) + 1, threading.current_thread().name)
+            return self._threads[ident][0]
+
+    @contextmanager
+    def span(self, name: str, cat: str = 'job', args: dict = None):
+        tid = self._tid()
+        start = self._now_us()
+        try:
+            yield
+        finally:
+            event = {
+                'name': name, 'cat': cat, 'ph': 'X', 'pid': 1, 'tid': tid,
+                'ts': start, 'dur': self._now_us() - start, 'args': args or {}
+            }
+            with self._lock:
+                self._events.append(event)
+
+    def wrap(self, func, name: str, cat: str = 'job', args: dict = None):
+        """Return func wrapped in a span, for handing to an executor"""
+        def traced(*a, **kw):
+            with self.span(name, cat, args):
+                return func(*a, **kw)
+        return traced
+
+    def instant(self, name: str, cat: str = 'job', args: dict = None):
+        event = {
+            'name': name, 'cat': cat, 'ph': 'i', 's': 'p', 'pid': 1, 'tid': self._tid(),
+            'ts': self._now_us(), 'args': args or {}
+        }
+        with self._lock:
+            self._events.append(event)
+
+    def to_chrome_trace(self) -> dict:
+        with self._lock:
+            events = list(self._events)
+            threads = list(self._threads.values())
+        metadata = [{'name': 'process_name', 'ph': 'M', 'pid': 1, 'args': {'name': f'job {self.process_id}'}}]
+        metadata += [
+            {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': name}}
+            for tid, name in threads
+        ]
+        return {'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}
+
+
+class _NullTracer:
+    """Stand-in used when tracing is off so call sites stay unconditional"""
+    @contextmanager
+    def span(self, name, cat='job', args=None):
+        yield
+
+    def wrap(self, func, name, cat='job', args=None):
+        return func
+
+    def instant(self, name, cat='job', args=None):
+        pass
+
+
+_null_tracer = _NullTracer()
+_traces = OrderedDict()
+_traces_lock = Lock()
+
+
+def start_trace(process_id: str) -> Tracer:
+    """Enable tracing for a job, keeping only the most recent MAX_TRACES"""
+    tracer = Tracer(process_id)
+    with _traces_lock:
+        _traces[process_id] = tracer
+        while len(_traces) > MAX_TRACES:
+            _traces.popitem(last=False)
+    return tracer
+
+
+def get_tracer(process_id: str):
+    """Tracer for the job, or a no-op tracer if tracing is off for it"""
+    with _traces_lock:
+        return _traces.get(process_id, _null_tracer)
+
+
+def find_trace(process_id: str):
+    with _traces_lock:
+        return _traces.get(process_id)
+
+
+def tracing_requested(data: dict) -> bool:
+    return bool(data.get('trace')) or os.environ.get('TRACE_ALL_JOBS') == '1'
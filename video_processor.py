@@ -8,13 +8,22 @@ import re
 import json
 import m3u8
 import psutil
-from typing import List, Dict, Tuple
+import functools
+from typing import List, Dict, Optional, Tuple
 from progress_tracker import progress_tracker
+from metrics import (
+    PLAYLIST_FETCH_SECONDS, SEGMENT_DOWNLOAD_SECONDS, SEGMENT_BYTES, SEGMENT_FAILURES,
+    SEGMENT_RETRIES, SEGMENT_INVALID, SEGMENT_QUEUE_DEPTH, REMUX_SECONDS, ENCODE_SECONDS, ENCODE_REALTIME_FACTOR,
+    ENCODE_FRAMES_DROPPED
+)
+from tracing import get_tracer
+from segment_validator import SegmentValidator, SegmentValidationError
+from cancellation import cancel_registry, JobCancelled
 from flask import current_app
 from pathlib import Path
 import threading
 import concurrent.futures
-from urllib.parse import urljoin
+from urllib.parse import urlsplit, urlunsplit
 
 # Configure custom logger
 class EmojiFormatter(logging.Formatter):
@@ -78,6 +87,11 @@ def format_time(seconds):
     secs = int(seconds % 60)
     return f"{hours:02d}:{minutes:02d}:{secs:02d}"
 
+def parse_time(timestamp: str) -> float:
+    """Parse HH:MM:SS into seconds"""
+    hours, minutes, seconds = timestamp.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
 def format_speed(bytes_per_second):
     """Format speed in bytes/second to a human-readable format"""
     if bytes_per_second < 1024:
@@ -104,48 +118,265 @@ def get_duration_from_ffmpeg(file_or_url):
     except:
         return None
 
-def get_m3u8_info(url: str) -> Tuple[int, List[Tuple[str, float]], float]:
-    """Get total segments, their URLs, and actual durations from M3U8 playlist"""
-    try:
-        playlist = m3u8.load(url)
-        total_duration = 0
-        segments = []
+# Variant selection for master playlists: 'auto' downloads the lowest rendition
+# that still has VARIANT_MIN_HEIGHT lines and enough bitrate for the trim
+# outputs; 'best' always takes the highest bandwidth
+VARIANT_POLICIES = ('auto', 'best')
+VARIANT_MIN_HEIGHT = int(os.environ.get('VARIANT_MIN_HEIGHT', 720))
 
-        # Check if it's a master playlist
-        if playlist.playlists:  # Master playlist case
-            best_playlist = max(playlist.playlists, key=lambda p: p.stream_info.bandwidth)
-            playlist = m3u8.load(best_playlist.uri)
+def select_variant(playlists, policy: str = 'auto', duration: float = 0, max_bytes: int = None):
+    """Pick a variant from a master playlist's renditions, within max_bytes if given"""
+    by_bandwidth = sorted(playlists, key=lambda p: p.stream_info.bandwidth or 0)
+    if policy == 'best':
+        return by_bandwidth[-1]
 
-        # Extract segment info
-        segments = [(seg.uri, seg.duration) for seg in playlist.segments]
-        total_duration = sum(seg[1] for seg in segments)
+    min_bandwidth = sum(target['bitrate'] for target in OUTPUT_TARGETS.values()) * 1000
 
-        return len(segments), segments, total_duration
-    except Exception as e:
-        logger.error(f"Error parsing M3U8: {e}")
-        return 0, [], 0
+    def fits_quality(variant):
+        resolution = variant.stream_info.resolution
+        return ((not resolution or resolution[1] >= VARIANT_MIN_HEIGHT)
+                and (variant.stream_info.bandwidth or 0) >= min_bandwidth)
+
+    def fits_budget(variant):
+        return not (max_bytes and duration) or (variant.stream_info.bandwidth or 0) * duration / 8 <= max_bytes
+
+    # Lowest rendition that's good enough; otherwise the best one that fits the budget
+    candidates = [p for p in by_bandwidth if fits_budget(p)] or by_bandwidth[:1]
+    return next((p for p in candidates if fits_quality(p)), candidates[-1])
+
+def load_media_playlist(video_url: str, policy: str = 'auto', max_bytes: int = None) -> Tuple[m3u8.M3U8, int]:
+    """
+    Load the media playlist for video_url, choosing a variant first if it's a
+    master playlist. Returns the playlist and the variant's advertised
+    bandwidth (0 if not a master playlist).
+    """
+    playlist = m3u8.load(video_url)
+    if not playlist.playlists:
+        return playlist, 0
+
+    variant = select_variant(playlist.playlists, policy)
+    media = m3u8.load(variant.absolute_uri)
+    if max_bytes and policy != 'best':
+        # Renditions share a duration, so the first one loaded is enough to apply the budget
+        duration = sum(seg.duration or 0 for seg in media.segments)
+        budgeted = select_variant(playlist.playlists, policy, duration, max_bytes)
+        if budgeted is not variant:
+            variant, media = budgeted, m3u8.load(budgeted.absolute_uri)
+
+    resolution = variant.stream_info.resolution
+    logger.info(
+        f"🎚️ Selected variant: {(variant.stream_info.bandwidth or 0) / 1000:.0f} kbps"
+        + (f" ({resolution[0]}x{resolution[1]})" if resolution else "")
+        + f" of {len(playlist.playlists)}"
+    )
+    return media, variant.stream_info.bandwidth or 0
 
-def download_segment(segment_info: Tuple[str, str, str]) -> bool:
-    """Download a single M3U8 segment without modifying its filename."""
-    url, original_filename, output_dir = segment_info
+def normalize_playlist_url(url: str) -> str:
+    """Canonical form of a playlist URL for de-duplicating identical requests"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    port = parts.port
+    if port and not ((scheme == 'http' and port == 80) or (scheme == 'https' and port == 443)):
+        host = f"{host}:{port}"
+    return urlunsplit((scheme, host, parts.path or '/', parts.query, ''))
+
+def estimate_download_size(video_url: str, policy: str = 'auto', max_bytes: int = None) -> int:
+    """
+    Estimate the bytes a download will need from the playlist, as
+    bandwidth x duration of the variant that would be selected. Falls back to
+    the first segment's size x segment count when no bandwidth is advertised.
+    Returns 0 if it can't be estimated.
+    """
     try:
-        response = requests.get(url, stream=True, timeout=10)
-        response.raise_for_status()
-        
-        output_path = os.path.join(output_dir, original_filename)
+        playlist, bandwidth = load_media_playlist(video_url, policy, max_bytes)
+
+        duration = sum(seg.duration or 0 for seg in playlist.segments)
+        if bandwidth and duration:
+            return int(bandwidth * duration / 8)
+
+        if playlist.segments:
+            response = requests.head(playlist.segments[0].absolute_uri, timeout=10, allow_redirects=True)
+            segment_size = int(response.headers.get('Content-Length', 0))
+            return segment_size * len(playlist.segments)
+        return 0
+    except Exception as e:
+        logger.warning(f"Could not estimate download size: {e}")
+        return 0
+
+# Segment fetch attempts before giving up, and optional TS continuity checking
+MAX_SEGMENT_ATTEMPTS = int(os.environ.get('SEGMENT_ATTEMPTS', 3))
+CHECK_TS_CONTINUITY = os.environ.get('SEGMENT_CONTINUITY_CHECK') == '1'
 
-        with open(output_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
+def fetch_segment(url: str, output_path: str, filename: str, cancel_event: threading.Event = None,
+                  encrypted: bool = False, container: str = 'ts') -> int:
+    """Stream one segment to disk, validating it as it arrives. Returns its size."""
+    response = requests.get(url, stream=True, timeout=10)
+    response.raise_for_status()
+
+    # Content-Length only describes the body when it isn't compressed in transit
+    expected_length = None
+    if 'Content-Length' in response.headers and not response.headers.get('Content-Encoding'):
+        expected_length = int(response.headers['Content-Length'])
+    validator = SegmentValidator(
+        filename,
+        expected_length=expected_length,
+        content_type=response.headers.get('Content-Type', ''),
+        check_continuity=CHECK_TS_CONTINUITY,
+        encrypted=encrypted,
+        container=container
+    )
+
+    # Write to a .part file so a bad attempt never leaves a segment behind
+    part_path = output_path + '.part'
+    try:
+        with open(part_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=65536):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise JobCancelled()
                 if chunk:
+                    validator.feed(chunk)
                     f.write(chunk)
-        
-        return True
-    except Exception as e:
-        logger.debug(f"⚠️ Failed to download segment {original_filename}: {e}")
-        return False
+        validator.finish()
+        os.replace(part_path, output_path)
+    finally:
+        response.close()
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    return validator.size
+
+# Packed audio segments keep an extension ffmpeg's hls demuxer will open
+PACKED_AUDIO_EXTENSIONS = {'.aac': '.aac', '.ac3': '.ac3', '.ec3': '.eac3', '.eac3': '.eac3', '.mp3': '.mp3'}
+
+def segment_container(segment) -> Tuple[str, str]:
+    """
+    The container the playlist declares for a segment ('fmp4', 'packed_audio'
+    or 'ts') and the extension to save it under. CDNs serve segments under
+    any name (.jpg, .php, ...), so the URI's own extension isn't trusted.
+    """
+    if segment.init_section:
+        return 'fmp4', '.m4s'
+    extension = os.path.splitext(urlsplit(segment.absolute_uri).path)[1].lower()
+    if extension in PACKED_AUDIO_EXTENSIONS:
+        return 'packed_audio', PACKED_AUDIO_EXTENSIONS[extension]
+    return 'ts', '.ts'
+
+def fetch_resource(url: str, output_path: str, byterange: str = None,
+                   cancel_event: threading.Event = None):
+    """Save a small playlist resource (decryption key, init section) to disk"""
+    headers = {}
+    if byterange:
+        length, _, offset = byterange.partition('@')
+        length, offset = int(length), int(offset or 0)
+        headers['Range'] = f'bytes={offset}-{offset + length - 1}'
+    for attempt in range(1, MAX_SEGMENT_ATTEMPTS + 1):
+        if cancel_event is not None and cancel_event.is_set():
+            raise JobCancelled()
+        try:
+            response = requests.get(url, headers=headers, timeout=10)
+            response.raise_for_status()
+            break
+        except requests.RequestException:
+            if attempt == MAX_SEGMENT_ATTEMPTS:
+                raise
+            time.sleep(0.5 * attempt)
+    content = response.content
+    if byterange and response.status_code != 206:
+        content = content[offset:offset + length]  # Server ignored the Range header
+    with open(output_path, 'wb') as f:
+        f.write(content)
+
+def localize_resource(resource, prefix: str, extension: str, output_dir: str,
+                      fetched: Dict[tuple, str], cancel_event: threading.Event = None):
+    """
+    Fetch a segment's key or init section into output_dir (once per URI) and
+    point the playlist at the local copy: from a local playlist, ffmpeg only
+    opens file, crypto and data URLs.
+    """
+    if resource.uri in fetched.values():
+        return  # Shared between segments and already rewritten
+    if urlsplit(resource.absolute_uri).scheme not in ('http', 'https'):
+        return
+    byterange = getattr(resource, 'byterange', None)
+    source = (resource.absolute_uri, byterange)
+    if source not in fetched:
+        local_name = f"{prefix}_{len(fetched):03d}{extension}"
+        fetch_resource(resource.absolute_uri, os.path.join(output_dir, local_name), byterange, cancel_event)
+        fetched[source] = local_name
+    resource.uri = fetched[source]
+    if byterange:
+        resource.byterange = None  # The local copy is just that range
+
+def download_segment(segment_info: Tuple[str, str, str, threading.Event, bool, str]) -> bool:
+    """Download a single M3U8 segment to its local filename, re-fetching bad copies."""
+    url, original_filename, output_dir, cancel_event, encrypted, container = segment_info
+    output_path = os.path.join(output_dir, original_filename)
+
+    for attempt in range(1, MAX_SEGMENT_ATTEMPTS + 1):
+        start = time.perf_counter()
+        try:
+            size = fetch_segment(url, output_path, original_filename, cancel_event, encrypted, container)
+            SEGMENT_DOWNLOAD_SECONDS.labels(result='ok').observe(time.perf_counter() - start)
+            SEGMENT_BYTES.observe(size)
+            return True
+        except JobCancelled:
+            return False
+        except SegmentValidationError as e:
+            SEGMENT_DOWNLOAD_SECONDS.labels(result='invalid').observe(time.perf_counter() - start)
+            SEGMENT_INVALID.labels(reason=e.reason).inc()
+            logger.warning(f"⚠️ Invalid segment (attempt {attempt}/{MAX_SEGMENT_ATTEMPTS}): {e}")
+        except Exception as e:
+            SEGMENT_DOWNLOAD_SECONDS.labels(result='error').observe(time.perf_counter() - start)
+            logger.debug(f"⚠️ Failed to download segment {original_filename} (attempt {attempt}): {e}")
+
+        if attempt < MAX_SEGMENT_ATTEMPTS:
+            SEGMENT_RETRIES.inc()
+            if cancel_event is not None:
+                if cancel_event.wait(0.5 * attempt):
+                    return False
+            else:
+                time.sleep(0.5 * attempt)
 
-def convert_m3u8_to_mp4(m3u8_path: str, output_path: str):
+    SEGMENT_FAILURES.inc()
+    return False
+
+# MP4 layouts for the remuxed download:
+#   faststart  - regular MP4; ffmpeg rewrites the file to move the moov atom to the front
+#   fragmented - fragmented MP4 written in a single pass (no rewrite), still streamable
+OUTPUT_MODES = {
+    'faststart': ['-movflags', '+faststart'],
+    'fragmented': ['-movflags', '+frag_keyframe+empty_moov+default_base_moof'],
+}
+
+def run_ffmpeg(cmd: List[str], cancel_event: threading.Event = None) -> subprocess.CompletedProcess:
+    """
+    Run an FFmpeg/FFprobe command like subprocess.run(check=True), terminating
+    it promptly if cancel_event is set
+    """
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    while True:
+        try:
+            stdout, stderr = process.communicate(timeout=0.25)
+            break
+        except subprocess.TimeoutExpired:
+            if cancel_event is not None and cancel_event.is_set():
+                process.terminate()
+                try:
+                    process.communicate(timeout=5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.communicate()
+                raise JobCancelled()
+
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, cmd, stdout, stderr)
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+def convert_m3u8_to_mp4(m3u8_path: str, output_path: str, output_mode: str = 'faststart',
+                        cancel_event: threading.Event = None):
     """Convert M3U8 playlist to MP4 using FFmpeg"""
+    if output_mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output mode: {output_mode}")
     try:
         cmd = [
             'ffmpeg',
@@ -153,15 +384,52 @@ def convert_m3u8_to_mp4(m3u8_path: str, output_path: str):
             '-i', m3u8_path,
             '-c', 'copy',
             '-bsf:a', 'aac_adtstoasc',
-            '-movflags', '+faststart',
+            *OUTPUT_MODES[output_mode],
             '-y', output_path
         ]
-        subprocess.run(cmd, check=True, capture_output=True)
+        with REMUX_SECONDS.time():
+            run_ffmpeg(cmd, cancel_event)
         logger.info(f"✅ MP4 conversion successful: {output_path}")
+    except JobCancelled:
+        raise
     except Exception as e:
         logger.error(f"❌ MP4 conversion failed: {e}")
         raise
 
+# Browser preview proxy: small, low bitrate, short GOP so scrubbing stays responsive
+PROXY_HEIGHT = int(os.environ.get('PROXY_HEIGHT', 360))
+
+def generate_proxy(input_path: str, proxy_path: str, cancel_event: threading.Event = None):
+    """Encode a low-resolution preview of input_path for the cropper and time picker"""
+    temp_path = proxy_path + '.part'
+    try:
+        cmd = [
+            'ffmpeg',
+            '-hide_banner',
+            '-loglevel', 'error',
+            '-i', input_path,
+            '-vf', f'scale=-2:min({PROXY_HEIGHT}\\,ih)',
+            '-c:v', 'libx264',
+            '-preset', 'veryfast',
+            '-crf', '30',
+            '-g', '30',
+            '-c:a', 'aac',
+            '-b:a', '64k',
+            '-ac', '1',
+            '-movflags', '+faststart',
+            '-f', 'mp4',
+            '-y', temp_path
+        ]
+        run_ffmpeg(cmd, cancel_event)
+        os.replace(temp_path, proxy_path)
+        logger.info(f"✅ Preview proxy ready: {proxy_path}")
+    except Exception as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        if not isinstance(e, JobCancelled):
+            logger.error(f"❌ Proxy generation failed: {e}")
+        raise
+
 def get_optimal_workers():
     """Calculate optimal number of worker threads based on system resources"""
     try:
@@ -221,10 +489,14 @@ def generate_download_report(total_segments: int, elapsed_time: float, final_spe
     ]
     return "\n".join(report)
 
-def download_full_video(video_url: str, filename: str, process_id: str) -> str:
+def download_full_video(video_url: str, filename: str, process_id: str,
+                        output_mode: str = 'faststart', variant: str = 'auto',
+                        max_bytes: int = None) -> str:
     """Download video directly using parallel segment downloading"""
     output_path = os.path.join(get_downloads_path(), 'uploads', filename)
     start_time = time.time()
+    tracer = get_tracer(process_id)
+    cancel_event = cancel_registry.event(process_id)
     
     # Create temporary directory for segments
     temp_dir = os.path.join(get_downloads_path(), 'temp', process_id)
@@ -235,36 +507,43 @@ def download_full_video(video_url: str, filename: str, process_id: str) -> str:
     local_m3u8_path = os.path.join(temp_dir, m3u8_filename)
 
     try:
-        # Download the M3U8 file from the given URL
+        # Download the M3U8 playlist (and the selected variant, for master playlists)
         logger.info("\n🔍 Downloading M3U8 playlist...")
-        response = requests.get(video_url, stream=True, timeout=10)
-        response.raise_for_status()  # Ensure the request was successful
-
-        # Save the downloaded M3U8 file locally
-        with open(local_m3u8_path, 'wb') as f:
-            f.write(response.content)
-
-        # Parse the M3U8 file to extract segment details
-        total_segments, segment_data, total_duration = get_m3u8_info(local_m3u8_path)
-        if total_segments == 0 or not segment_data:
+        with PLAYLIST_FETCH_SECONDS.time(), tracer.span('playlist_fetch', 'download', {'url': video_url}):
+            playlist, _ = load_media_playlist(video_url, variant, max_bytes)
+        total_segments = len(playlist.segments)
+        total_duration = sum(seg.duration or 0 for seg in playlist.segments)
+        if total_segments == 0:
             raise Exception("No segments found in playlist")
         
         logger.info(f"\n📋 Playlist Analysis:")
         logger.info(f"   ├─ Total Segments: {total_segments}")
         logger.info(f"   └─ Duration: {format_time(int(total_duration))}\n")
         
-        # Prepare segment download tasks
-        base_url = video_url.rsplit('/', 1)[0] + '/'
-        download_tasks = [
-            (urljoin(base_url, seg_url), seg_url, temp_dir)  # Keep original TS filename
-            for seg_url, _ in segment_data
-        ]
+        # Prepare segment download tasks. Segments are saved under numbered
+        # local names (URIs may be absolute or carry query strings) and the
+        # local playlist is rewritten to point at them; keys and init
+        # sections are fetched now and rewritten the same way
+        download_tasks = []
+        fetched_resources = {}
+        for index, segment in enumerate(playlist.segments):
+            container, extension = segment_container(segment)
+            local_name = f"segment_{index:05d}{extension}"
+            encrypted = bool(segment.key and segment.key.method and segment.key.method.upper() != 'NONE')
+            download_tasks.append((segment.absolute_uri, local_name, temp_dir, cancel_event, encrypted, container))
+            if segment.key and segment.key.uri:
+                localize_resource(segment.key, 'key', '.key', temp_dir, fetched_resources, cancel_event)
+            if segment.init_section:
+                localize_resource(segment.init_section, 'init', '.mp4', temp_dir, fetched_resources, cancel_event)
+            segment.uri = local_name
+        playlist.dump(local_m3u8_path)
         
         # Initialize progress tracking
         downloaded_segments = 0
         last_update_time = time.time()
         last_adjustment_time = time.time()
         update_interval = 0.5
+        last_speed = 0
         adjustment_interval = 2.0  # Check system load every 2 seconds
         
         # Start with optimal workers
@@ -272,13 +551,22 @@ def download_full_video(video_url: str, filename: str, process_id: str) -> str:
         executor = concurrent.futures.ThreadPoolExecutor(max_workers=num_workers)
         active_futures = set()
         pending_tasks = list(download_tasks)
+        SEGMENT_QUEUE_DEPTH.inc(len(pending_tasks))
         
         try:
             while pending_tasks or active_futures:
+                # Stop scheduling on cancel; in-flight fetches stop at their next chunk
+                if cancel_event.is_set():
+                    for future in active_futures:
+                        future.cancel()
+                    raise JobCancelled()
+                
                 # Submit new tasks if we have capacity
                 while pending_tasks and len(active_futures) < num_workers:
                     task = pending_tasks.pop(0)
-                    future = executor.submit(download_segment, task)
+                    SEGMENT_QUEUE_DEPTH.dec()
+                    traced_segment = tracer.wrap(download_segment, 'segment', 'download', {'segment': task[1]})
+                    future = executor.submit(traced_segment, task)
                     active_futures.add(future)
                 
                 # Check completed futures
@@ -297,6 +585,10 @@ def download_full_video(video_url: str, filename: str, process_id: str) -> str:
                     new_workers = adjust_workers(num_workers, cpu_percent, memory_percent)
                     
                     if new_workers != num_workers:
+                        tracer.instant('executor_resize', 'download', {
+                            'from': num_workers, 'to': new_workers,
+                            'cpu_percent': cpu_percent, 'memory_percent': memory_percent
+                        })
                         num_workers = new_workers
                         # Create new executor with adjusted worker count
                         old_executor = executor
@@ -316,7 +608,7 @@ def download_full_video(video_url: str, filename: str, process_id: str) -> str:
                         bytes_downloaded = sum(
                             os.path.getsize(os.path.join(temp_dir, f))
                             for f in os.listdir(temp_dir)
-                            if f.endswith('.ts')
+                            if f.startswith('segment_')
                         )
                         speed = bytes_downloaded / elapsed_time
                         
@@ -346,7 +638,8 @@ def download_full_video(video_url: str, filename: str, process_id: str) -> str:
                         last_speed = speed  # Store last speed for final report
         
         finally:
-            executor.shutdown(wait=True)
+            SEGMENT_QUEUE_DEPTH.dec(len(pending_tasks))
+            executor.shutdown(wait=True, cancel_futures=True)
         
         # Verify all segments were downloaded
         if downloaded_segments < total_segments:
@@ -360,7 +653,8 @@ def download_full_video(video_url: str, filename: str, process_id: str) -> str:
         })
         
         # Convert M3U8 to MP4
-        convert_m3u8_to_mp4(local_m3u8_path, output_path)
+        with tracer.span('remux', 'ffmpeg'):
+            convert_m3u8_to_mp4(local_m3u8_path, output_path, output_mode, cancel_event)
 
         # Generate and display download report
         total_time = time.time() - start_time
@@ -378,6 +672,16 @@ def download_full_video(video_url: str, filename: str, process_id: str) -> str:
         
         return filename
         
+    except JobCancelled:
+        logger.info(f"🛑 Download cancelled: {filename}")
+        progress_tracker.update_progress(process_id, {
+            "status": "cancelled",
+            "message": "🛑 Download cancelled"
+        })
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+        
     except Exception as e:
         error_msg = str(e)
         logger.error(f"Download failed: {error_msg}")
@@ -416,15 +720,150 @@ def get_video_bitrate(file_path: str) -> float:
     except:
         return 0
 
+def record_encode_metrics(output: str, elapsed: float, clip_seconds: float):
+    """Record encode time and realtime factor for one trim output"""
+    ENCODE_SECONDS.labels(output=output).observe(elapsed)
+    if elapsed > 0:
+        ENCODE_REALTIME_FACTOR.labels(output=output).observe(clip_seconds / elapsed)
+
+# Screen region encoding: 'screen_content' drops duplicate frames (mpdecimate,
+# variable frame rate) and tunes x264 for still imagery; 'standard' (the default) encodes every frame
+SCREEN_MODES = ('standard', 'screen_content')
+SCREEN_CONTENT_KEYINT = 300  # Frames; long GOPs are cheap when most frames are dropped
+
+# Per-output targets for trim_video: bitrate cap in Kbps and whether audio is kept
+OUTPUT_TARGETS = {
+    'screen': {'bitrate': 250, 'audio': False},
+    'webcam': {'bitrate': 100, 'audio': True},
+}
+
+def is_full_frame(crop: Dict, media_info: Dict) -> bool:
+    """True if the crop region covers the whole source frame"""
+    if not media_info.get('width') or not media_info.get('height'):
+        return False
+    return (int(crop['x']) <= 0 and int(crop['y']) <= 0
+            and int(crop['width']) >= media_info['width']
+            and int(crop['height']) >= media_info['height'])
+
+@functools.lru_cache(maxsize=None)
+def ffmpeg_version() -> Optional[Tuple[int, int]]:
+    """FFmpeg's (major, minor) release, or None for git builds and when it can't be run"""
+    try:
+        output = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = re.match(r'ffmpeg version n?(\d+)\.(\d+)', output)
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+def vfr_args() -> List[str]:
+    """Variable frame rate output; -fps_mode replaced -vsync in FFmpeg 5.1"""
+    version = ffmpeg_version()
+    if version is not None and version < (5, 1):
+        return ['-vsync', 'vfr']
+    return ['-fps_mode', 'vfr']
+
+def plan_trim_output(region: str, crop: Dict, media_info: Dict, screen_mode: str = 'standard') -> Dict:
+    """
+    Decide how to produce one trim output from the probed source: stream copy
+    wherever the source already meets the target, encode only what must change.
+    Returns None if the output would have no streams.
+    """
+    target = OUTPUT_TARGETS[region]
+    plan = {'region': region, 'video': None, 'filters': [], 'video_args': [], 'audio': None,
+            'input_seek': False, 'screen_content': False}
+
+    if crop:
+        if not is_full_frame(crop, media_info):
+            plan['filters'].append(
+                f'crop={int(crop["width"])}:{int(crop["height"])}:{int(crop["x"])}:{int(crop["y"])}'
+            )
+        if (media_info.get('fps') or 0) > 30:
+            plan['filters'].append('fps=30')
+
+        bitrate = media_info.get('bitrate')
+        over_target = bitrate is None or bitrate > target['bitrate']
+        if not plan['filters'] and not over_target and media_info.get('video_codec') == 'h264':
+            # Nothing to change: copy the video and cut on keyframes
+            plan['video'] = 'copy'
+            plan['input_seek'] = True
+        else:
+            plan['video'] = 'encode'
+            if over_target:
+                plan['video_args'] = ['-b:v', f"{target['bitrate']}k"]
+            if region == 'screen' and screen_mode == 'screen_content':
+                plan['screen_content'] = True
+                plan['filters'].append('mpdecimate')
+                plan['video_args'] += ['-tune', 'stillimage', '-g', str(SCREEN_CONTENT_KEYINT), *vfr_args()]
+
+    if target['audio'] and media_info.get('audio_codec'):
+        plan['audio'] = 'copy' if media_info['audio_codec'] == 'aac' else 'encode'
+
+    if plan['video'] is None and plan['audio'] is None:
+        return None
+    return plan
+
+def build_trim_command(plan: Dict, input_path: str, start_time: str, end_time: str, output_path: str) -> List[str]:
+    """FFmpeg command line for a plan from plan_trim_output()"""
+    command = [
+        'ffmpeg',
+        '-hide_banner',         # Hide FFmpeg compilation details
+        '-loglevel', 'error',   # Only show errors
+    ]
+    if plan['input_seek']:
+        # Input seeking snaps to the keyframe before start_time, as required for stream copy
+        duration = parse_time(end_time) - parse_time(start_time)
+        command += ['-ss', start_time, '-i', input_path, '-t', str(duration)]
+    else:
+        command += ['-i', input_path, '-ss', start_time, '-to', end_time]
+
+    if plan['video'] == 'copy':
+        command += ['-c:v', 'copy']
+    elif plan['video'] == 'encode':
+        if plan['filters']:
+            command += ['-filter:v', ','.join(plan['filters'])]
+        command += [*plan['video_args'], '-c:v', 'libx264']
+    else:
+        command += ['-vn']
+
+    if plan['audio'] == 'copy':
+        command += ['-c:a', 'copy']
+    elif plan['audio'] == 'encode':
+        command += ['-c:a', 'aac']
+    else:
+        command += ['-an']
+
+    return command + ['-y', output_path]
+
+def count_video_frames(file_path: str) -> int:
+    """Number of video frames (packets) in a file, or None if it can't be read"""
+    try:
+        cmd = [
+            'ffprobe',
+            '-v', 'error',
+            '-select_streams', 'v:0',
+            '-count_packets',
+            '-show_entries', 'stream=nb_read_packets',
+            '-of', 'default=noprint_wrappers=1:nokey=1',
+            file_path
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        return int(result.stdout.strip())
+    except Exception as e:
+        logger.error(f"Error counting video frames: {e}")
+        return None
+
 def trim_video(input_file: str, screen_output: str, webcam_output: str, 
                start_time: str, end_time: str, crop_data: Dict, 
-               process_id: str) -> List[str]:
+               process_id: str, screen_mode: str = 'standard') -> Tuple[List[str], int]:
     """
     Trim and crop video into screen share and webcam videos
-    Returns list of output file paths
+    Returns list of output file paths and the number of duplicate screen
+    frames dropped (None unless screen-content encoding ran)
     """
     input_path = os.path.join(get_downloads_path(), 'uploads', input_file)
     output_files = []
+    tracer = get_tracer(process_id)
+    cancel_event = cancel_registry.event(process_id)
     
     try:
         # Validate input file
@@ -436,130 +875,109 @@ def trim_video(input_file: str, screen_output: str, webcam_output: str,
         logger.info("="*50)
         
         # Get video info
-        video_info = get_video_info(input_path)
-        if not video_info:
+        with tracer.span('probe', 'ffmpeg'):
+            media_info = get_media_info(input_path)
+        if not media_info or not media_info.get('video_codec'):
             raise Exception("Could not get video information")
             
         logger.info(f"\n📊 Video Information:")
         logger.info(f"   ├─ 🕒 Time Range: {start_time} to {end_time}")
-        logger.info(f"   ├─ 🎥 Codec: {video_info['codec']}")
-        logger.info(f"   ├─ ⚡ FPS: {video_info['fps']}")
-        logger.info(f"   └─ 📊 Bitrate: {video_info['bitrate']} Kbps\n")
+        logger.info(f"   ├─ 🎥 Codec: {media_info['video_codec']} ({media_info['width']}x{media_info['height']})")
+        logger.info(f"   ├─ 🔊 Audio: {media_info['audio_codec'] or 'none'}")
+        logger.info(f"   ├─ ⚡ FPS: {media_info['fps']}")
+        logger.info(f"   └─ 📊 Bitrate: {media_info['bitrate']} Kbps\n")
         
-        # Process screen share area
-        screen_crop = crop_data['screen']
-        logger.info("🖥️ Processing Screen Recording...")
-        logger.info("\n")
-        
-        # Build filter string with quality checks
-        screen_filters = [
-            f'crop={int(screen_crop["width"])}:{int(screen_crop["height"])}:{int(screen_crop["x"])}:{int(screen_crop["y"])}'
+        clip_seconds = max(0.0, parse_time(end_time) - parse_time(start_time))
+        outputs = [
+            ('screen', screen_output, "🖥️ Processing Screen Recording...", "Screen recording"),
+            ('webcam', webcam_output, "📸 Processing Webcam Recording...", "Webcam video"),
         ]
-
-        # Add FPS filter if needed
-        if video_info['fps'] > 30:
-            screen_filters.append('fps=30')
-            
-        # Add bitrate control if needed
-        bitrate_args = []
-        if video_info['bitrate'] > 250:
-            bitrate_args = ['-b:v', '250k']
+        bitrates = {}
+        frames_dropped = None
         
-        screen_command = [
-            'ffmpeg',
-            '-hide_banner',         # Hide FFmpeg compilation details
-            '-loglevel', 'error',   # Only show errors
-            '-i', input_path,
-            '-ss', start_time,
-            '-to', end_time,
-            '-filter:v', ','.join(screen_filters),
-            *bitrate_args,
-            '-c:v', 'libx264',
-            '-an',  # No audio for screen share
-            '-y',
-            screen_output
-        ]
-        
-        try:
-            subprocess.run(screen_command, capture_output=True, text=True, check=True)
-            output_files.append(screen_output)
+        for index, (region, output_path, banner, label) in enumerate(outputs):
+            if cancel_event.is_set():
+                raise JobCancelled()
+            plan = plan_trim_output(region, crop_data.get(region), media_info, screen_mode)
+            if plan is None:
+                logger.info(f"⏭️ Skipping {region} output (no streams to write)")
+                continue
             
-            # Check screen recording bitrate
-            screen_bitrate = get_video_bitrate(screen_output)
-            logger.info(f"✅ Screen recording processed successfully - Bitrate: {screen_bitrate:.1f} Kbps")
-            if screen_bitrate > 250:
-                logger.warning(f"⚠️ Screen recording bitrate ({screen_bitrate:.1f} Kbps) is higher than recommended (250 Kbps)")
-                logger.warning("⚠️ Please check with tech team to fix this")
+            logger.info("\n" + banner)
+            logger.info(f"   └─ 🧭 Plan: video={plan['video'] or 'none'}, audio={plan['audio'] or 'none'}\n")
+            command = build_trim_command(plan, input_path, start_time, end_time, output_path)
             
-            progress_tracker.update_progress(process_id, {
-                "status": "processing",
-                "message": "🎥 Processing webcam video...",
-                "progress": 50
-            })
-        except subprocess.CalledProcessError as e:
-            raise Exception(f"❌ Screen processing failed: {e.stderr}")
-        
-        # Process webcam area
-        logger.info("\n📸 Processing Webcam Recording...")
-        webcam_crop = crop_data['webcam']
+            try:
+                encode_start = time.perf_counter()
+                with tracer.span(f'encode_{region}', 'ffmpeg', {'command': ' '.join(command)}):
+                    run_ffmpeg(command, cancel_event)
+                record_encode_metrics(region, time.perf_counter() - encode_start, clip_seconds)
+                output_files.append(output_path)
+            except subprocess.CalledProcessError as e:
+                raise Exception(f"❌ {label} processing failed: {e.stderr}")
+            
+            # Report how many duplicate frames decimation removed
+            if plan['screen_content']:
+                expected = round(clip_seconds * min(media_info['fps'] or 30, 30))
+                encoded = count_video_frames(output_path)
+                if encoded is not None and expected:
+                    frames_dropped = max(0, expected - encoded)
+                    ENCODE_FRAMES_DROPPED.labels(output=region).inc(frames_dropped)
+                    logger.info(f"🧮 Dropped {frames_dropped} of {expected} duplicate frames ({frames_dropped / expected:.0%})")
+            
+            # Check output bitrate against the target
+            if plan['video']:
+                target = OUTPUT_TARGETS[region]['bitrate']
+                bitrates[region] = get_video_bitrate(output_path)
+                logger.info(f"✅ {label} processed successfully - Bitrate: {bitrates[region]:.1f} Kbps")
+                if bitrates[region] > target:
+                    logger.warning(f"⚠️ {label} bitrate ({bitrates[region]:.1f} Kbps) is higher than recommended ({target} Kbps)")
+                    logger.warning("⚠️ Please check with tech team to fix this")
+            else:
+                logger.info(f"✅ {label} processed successfully (audio only)")
+            
+            if index < len(outputs) - 1:
+                progress_tracker.update_progress(process_id, {
+                    "status": "processing",
+                    "message": "🎥 Processing webcam video...",
+                    "progress": 50
+                })
+        
+        if not output_files:
+            raise Exception("Nothing to produce: no crop regions and no audio")
+        
+        # Final success message with bitrate info
+        logger.info("\n" + "="*50)
+        logger.info("\n")
+        logger.info("✨ Video Processing Complete!")
+        for output_path in output_files:
+            region = 'screen' if output_path == screen_output else 'webcam'
+            bitrate = f"{bitrates[region]:.1f} Kbps" if region in bitrates else "audio only"
+            logger.info(f"   ├─ {os.path.basename(output_path)} ({bitrate})")
         logger.info("\n")
+        logger.info("="*50 + "\n")
         
-        # Build filter string with quality checks for webcam
-        webcam_filters = [
-            f'crop={int(webcam_crop["width"])}:{int(webcam_crop["height"])}:{int(webcam_crop["x"])}:{int(webcam_crop["y"])}'
-        ]
+        progress_tracker.update_progress(process_id, {
+            "status": "complete",
+            "message": "✅ Processing complete",
+            "progress": 100,
+            "frames_dropped": frames_dropped
+        })
         
-        # Add FPS filter if needed
-        if video_info['fps'] > 30:
-            webcam_filters.append('fps=30')
-
-        if video_info['bitrate'] > 100:
-            bitrate_args = ['-b:v', '100k']
-
-        webcam_command = [
-            'ffmpeg',
-            '-hide_banner',         # Hide FFmpeg compilation details
-            '-loglevel', 'error',   # Only show errors
-            '-i', input_path,
-            '-ss', start_time,
-            '-to', end_time,
-            '-filter:v', ','.join(webcam_filters),
-            *bitrate_args,
-            '-c:v', 'libx264',
-            '-c:a', 'aac',
-            '-y',
-            webcam_output
-        ]
+        return output_files, frames_dropped
         
-        try:
-            subprocess.run(webcam_command, capture_output=True, text=True, check=True)
-            output_files.append(webcam_output)
-            
-            # Check webcam recording bitrate
-            webcam_bitrate = get_video_bitrate(webcam_output)
-            logger.info(f"✅ Webcam video processed successfully - Bitrate: {webcam_bitrate:.1f} Kbps")
-            if webcam_bitrate > 100:
-                logger.warning(f"⚠️ Webcam recording bitrate ({webcam_bitrate:.1f} Kbps) is higher than recommended (100 Kbps)")
-                logger.warning("⚠️ Please check with tech team to fix this")
-            
-            # Final success message with bitrate info
-            logger.info("\n" + "="*50)
-            logger.info("\n")
-            logger.info("✨ Video Processing Complete!")
-            logger.info(f"   ├─ 🖥️ Screen: {os.path.basename(screen_output)} ({screen_bitrate:.1f} Kbps)")
-            logger.info(f"   └─ 📸 Webcam: {os.path.basename(webcam_output)} ({webcam_bitrate:.1f} Kbps)")
-            logger.info("\n")
-            logger.info("="*50 + "\n")
-            
-            progress_tracker.update_progress(process_id, {
-                "status": "complete",
-                "message": "✅ Processing complete",
-                "progress": 100
-            })
-        except subprocess.CalledProcessError as e:
-            raise Exception(f"❌ Webcam processing failed: {e.stderr}")
+    except JobCancelled:
+        logger.info("🛑 Processing cancelled")
+        progress_tracker.update_progress(process_id, {
+            "status": "cancelled",
+            "message": "🛑 Processing cancelled"
+        })
         
-        return output_files
+        # Remove finished and partially written outputs
+        for file in (screen_output, webcam_output):
+            if os.path.exists(file):
+                os.remove(file)
+        raise
         
     except Exception as e:
         error_msg = str(e)
@@ -619,39 +1037,40 @@ def calculate_default_crop_areas(video_width: int, video_height: int) -> dict:
         }
     }
 
-def get_video_info(file_path: str) -> dict:
-    """Get video metadata using FFprobe"""
+
+def get_media_info(file_path: str) -> dict:
+    """Get duration and stream details for a media file in a single FFprobe call"""
     try:
         cmd = [
             'ffprobe',
             '-v', 'error',
-            '-select_streams', 'v:0',
-            '-show_entries', 'stream=codec_name,r_frame_rate,bit_rate',
+            '-show_entries',
+            'format=duration,bit_rate:stream=codec_type,codec_name,width,height,r_frame_rate,bit_rate',
             '-of', 'json',
             file_path
         ]
-        
         result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        video_info = json.loads(result.stdout)
-        
-        # Parse frame rate
-        fps_fraction = video_info['streams'][0]['r_frame_rate'].split('/')
-        fps = float(fps_fraction[0]) / float(fps_fraction[1])
-        
-        # Convert bitrate from bits/s to Kbps
-        bitrate = int(video_info['streams'][0]['bit_rate']) / 1000
-        
-        info = {
-            'codec': video_info['streams'][0]['codec_name'],
-            'fps': fps,
-            'bitrate': bitrate
-        }
+        probe = json.loads(result.stdout)
 
-        # Log processed info
-        print("Video Info:", json.dumps(info, indent=2))
+        fmt = probe.get('format', {})
+        video = next((s for s in probe.get('streams', []) if s.get('codec_type') == 'video'), {})
+        audio = next((s for s in probe.get('streams', []) if s.get('codec_type') == 'audio'), {})
 
-        return info
+        fps = None
+        if video.get('r_frame_rate'):
+            num, den = video['r_frame_rate'].split('/')
+            fps = float(num) / float(den) if float(den) else None
 
+        bitrate = video.get('bit_rate') or fmt.get('bit_rate')
+        return {
+            'duration': float(fmt['duration']) if fmt.get('duration') else None,
+            'width': video.get('width'),
+            'height': video.get('height'),
+            'video_codec': video.get('codec_name'),
+            'audio_codec': audio.get('codec_name'),
+            'fps': fps,
+            'bitrate': int(bitrate) / 1000 if bitrate and bitrate != 'N/A' else None
+        }
     except Exception as e:
-        logger.error(f"Error getting video info: {e}")
-        return None
\ No newline at end of file
+        logger.error(f"Error getting media info: {e}")
+        return None
@@ -0,0 +1,175 @@
+import hashlib
+import os
+import struct
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional
+
+CHUNK_SIZE = 1024 * 1024
+ZIP_MAX_SIZE = 0xFFFFFFFF
+
+# Stored entries with a trailing data descriptor (general purpose flag bit 3),
+# so CRCs can be computed while streaming and the archive size is known
+# up front from the file sizes alone.
+_FLAGS = 0x08
+_VERSION = 20
+
+
+def _dos_datetime(timestamp: float) -> tuple:
+    """Convert a unix timestamp into (dos_time, dos_date)"""
+    t = time.localtime(timestamp)
+    year = max(t.tm_year, 1980)
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+def build_entries(file_paths: List[str]) -> List[Dict]:
+    """Collect the metadata needed to stream each file into a stored ZIP"""
+    entries = []
+    for path in file_paths:
+        stat = os.stat(path)
+        if stat.st_size >= ZIP_MAX_SIZE:
+            raise ValueError(f"File too large for streamed zip: {os.path.basename(path)}")
+        dos_time, dos_date = _dos_datetime(stat.st_mtime)
+        entries.append({
+            'path': path,
+            'name': os.path.basename(path).encode('utf-8'),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'time': dos_time,
+            'date': dos_date,
+        })
+    return entries
+
+
+def zip_size(entries: List[Dict]) -> int:
+    """Exact size in bytes of the archive stream_zip() will produce"""
+    total = 22  # End of central directory record
+    for entry in entries:
+        name_len = len(entry['name'])
+        total += 30 + name_len + entry['size'] + 16  # Local header, data, descriptor
+        total += 46 + name_len  # Central directory header
+    return total
+
+
+def zip_etag(entries: List[Dict]) -> str:
+    """Strong ETag for the archive, derived from each entry's name, size and mtime"""
+    digest = hashlib.sha1()
+    for entry in entries:
+        digest.update(entry['name'])
+        digest.update(f":{entry['size']}:{entry['mtime_ns']};".encode())
+    return digest.hexdigest()
+
+
+def _file_crc(entry: Dict) -> int:
+    crc = 0
+    with open(entry['path'], 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _local_header(entry: Dict) -> bytes:
+    return struct.pack(
+        '<IHHHHHIIIHH',
+        0x04034b50, _VERSION, _FLAGS, 0,
+        entry['time'], entry['date'],
+        0, 0, 0,
+        len(entry['name']), 0
+    ) + entry['name']
+
+
+def _data_descriptor(entry: Dict, crc: int) -> bytes:
+    return struct.pack('<IIII', 0x08074b50, crc, entry['size'], entry['size'])
+
+
+def _central_header(entry: Dict, crc: int, offset: int) -> bytes:
+    return struct.pack(
+        '<IHHHHHHIIIHHHHHII',
+        0x02014b50, _VERSION, _VERSION, _FLAGS, 0,
+        entry['time'], entry['date'],
+        crc, entry['size'], entry['size'],
+        len(entry['name']), 0, 0, 0, 0, 0,
+        offset
+    ) + entry['name']
+
+
+def _end_record(count: int, cd_size: int, cd_offset: int) -> bytes:
+    return struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, count, count, cd_size, cd_offset, 0)
+
+
+def stream_zip(entries: List[Dict], start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Yield a stored (uncompressed) ZIP archive of the given entries.
+    start/end (end exclusive) select a byte range of the archive; file data
+    outside the range is never read unless its CRC is needed.
+    """
+    if end is None:
+        end = zip_size(entries)
+    crcs = {}
+    pos = 0
+
+    def clip(data: bytes) -> bytes:
+        lo = max(start, pos) - pos
+        hi = min(end, pos + len(data)) - pos
+        return data[lo:hi] if hi > lo else b''
+
+    def crc_for(index: int) -> int:
+        if index not in crcs:
+            crcs[index] = _file_crc(entries[index])
+        return crcs[index]
+
+    offsets = []
+    for index, entry in enumerate(entries):
+        offsets.append(pos)
+        if pos >= end:
+            break
+
+        header = _local_header(entry)
+        chunk = clip(header)
+        if chunk:
+            yield chunk
+        pos += len(header)
+
+        # File data: stream only the overlapping part, computing the CRC
+        # along the way when the whole file is covered
+        lo = max(start, pos) - pos
+        hi = min(end, pos + entry['size']) - pos
+        if hi > lo:
+            whole = lo == 0 and hi == entry['size']
+            crc = 0
+            with open(entry['path'], 'rb') as f:
+                f.seek(lo)
+                remaining = hi - lo
+                while remaining > 0:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    if whole:
+                        crc = zlib.crc32(chunk, crc)
+                    remaining -= len(chunk)
+                    yield chunk
+            if whole:
+                crcs[index] = crc
+        pos += entry['size']
+
+        if pos < end and pos + 16 > start:
+            yield clip(_data_descriptor(entry, crc_for(index)))
+        pos += 16
+
+    if pos >= end:
+        return
+
+    cd_offset = pos
+    for index, entry in enumerate(entries):
+        length = 46 + len(entry['name'])
+        if pos < end and pos + length > start:
+            yield clip(_central_header(entry, crc_for(index), offsets[index]))
+        pos += length
+
+    if pos < end:
+        yield clip(_end_record(len(entries), pos - cd_offset, cd_offset))